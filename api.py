@@ -1,14 +1,28 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 import pandas as pd
 import os
-from scripts.food_recommend import recommend_food
+from scripts.food_recommend import recommend_food, recommend_food_batch, recommend_substitutes, get_recommender
+from scripts.recipes_recommend import get_recipe_recommender
 import json
 from threading import Lock
+from contextlib import asynccontextmanager
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the food catalog and index, and the recipe model and embeddings, once before the first request
+    get_recommender()
+    # The recipe engine is optional: without its artifacts (or torch) the food endpoints still serve,
+    # and recipe requests retry loading it
+    try:
+        get_recipe_recommender()
+    except Exception as e:
+        print(f"⚠️ Recipe recommender not loaded at startup: {e}")
+    yield
+
+app = FastAPI(lifespan=lifespan)
 lock = Lock()
 
 HISTORY_FILE = "data/user_log/food.xlsx"
@@ -17,6 +31,30 @@ SHEET_NAME = 'User History'
 class RecommendationRequest(BaseModel):
     food_preference: str
     deficiencies: list
+    # Optional nutrient -> signed weight, e.g. {"iron": 3, "zinc": 1, "sodium": -2}
+    weights: Optional[Dict[str, float]] = None
+
+class BatchRecommendationRequest(BaseModel):
+    profiles: List[RecommendationRequest]
+
+class SubstituteRequest(BaseModel):
+    food_name: str
+    food_preference: Optional[str] = None
+    # Optional nutrient -> upper bound, e.g. {"sodium": 50}
+    max_nutrients: Optional[Dict[str, float]] = None
+    k: int = Field(10, gt=0)
+
+class RecipeRequest(BaseModel):
+    # Target value per nutrient column, e.g. {"Calories": 500, "ProteinContent": 30, ...}
+    nutrients: Dict[str, float]
+    ingredients: List[str]
+    food_preference: Optional[str] = None
+    k: int = Field(5, gt=0)
+    # Optional metadata filters
+    recipe_categories: Optional[List[str]] = None
+    max_cook_minutes: Optional[float] = Field(None, ge=0)
+    max_total_minutes: Optional[float] = Field(None, ge=0)
+    min_rating: Optional[float] = Field(None, ge=0, le=5)
 
 class UserHistory(BaseModel):
     name: str = Field(..., min_length=1)
@@ -44,13 +82,68 @@ async def get_recommendation(data: RecommendationRequest):
     """Get food recommendations based on preferences and deficiencies."""
     try:
         recommendation = recommend_food(
-            data.deficiencies if data.deficiencies else 'none', 
-            category=data.food_preference
+            data.deficiencies if data.deficiencies or data.weights else 'none', 
+            category=data.food_preference,
+            weights=data.weights
         )
         return {"recommendation": recommendation}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/get-recommendation-batch/")
+async def get_recommendation_batch(data: BatchRecommendationRequest):
+    """Get food recommendations for many profiles, in the same order."""
+    try:
+        recommendations = recommend_food_batch(
+            {"deficiencies": profile.deficiencies if profile.deficiencies or profile.weights else 'none',
+             "category": profile.food_preference,
+             "weights": profile.weights}
+            for profile in data.profiles
+        )
+        return {"recommendations": recommendations}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/get-substitutes/")
+async def get_substitutes(data: SubstituteRequest):
+    """Get foods with a similar nutrient profile to a given food."""
+    try:
+        substitutes = recommend_substitutes(
+            data.food_name,
+            category=data.food_preference,
+            max_nutrients=data.max_nutrients,
+            k=data.k
+        )
+        return {"substitutes": substitutes}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/get-recipe-recommendation/")
+async def get_recipe_recommendation(data: RecipeRequest):
+    """Get recipe recommendations based on nutrients, ingredients and diet preference."""
+    try:
+        recipes = get_recipe_recommender().recommend(
+            data.nutrients,
+            data.ingredients,
+            diet=data.food_preference,
+            k=data.k,
+            recipe_categories=data.recipe_categories,
+            max_cook_minutes=data.max_cook_minutes,
+            max_total_minutes=data.max_total_minutes,
+            min_rating=data.min_rating
+        )
+        return {"recipes": recipes}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/reload-recommender/")
+async def reload_recommender():
+    """Reload the food recommender if its data or model files changed on disk."""
+    try:
+        return {"reloaded": get_recommender().reload()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/save-history/")
 async def save_history(user_history: UserHistory):
 
@@ -1,7 +1,7 @@
-import pandas as pd
 import streamlit as st
 from datetime import date
 import requests
+from scripts.food_recommend import get_recommender
 
 API_BASE_URL = "http://127.0.0.1:8000"
 SAVE_HISTORY_URL = f"{API_BASE_URL}/save-history/"
@@ -112,11 +112,17 @@ st.markdown("""
 #         </div> 
 #     """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_food_recommender():
+    """Share one FoodRecommender (catalog loaded once) across reruns and sessions."""
+    return get_recommender()
+
 def load_data():
     """Load processed food data and extract unique categories."""
-    df = pd.read_csv("data/preprocessed/food.csv")
-    original_df = pd.read_csv("data/original/food.csv")
-    categories = df["main_category"].unique().tolist()
+    recommender = get_food_recommender()
+    df = recommender.df
+    original_df = recommender.original_df
+    categories = recommender.categories
     deficiencies = [
         'vitamin_D', 'calcium',  'vitamin_C', 'iron', 'potassium', 
         'vitamin_B_6', 'vitamin_B_12', 'vitamin_A', 'riboflavin', 'vitamin_E', 'folate_total',
@@ -1,8 +1,8 @@
+import os
 import streamlit as st
-import pandas as pd
 import matplotlib.pyplot as plt
-import re
-from scripts.recipes_recommend import recommend_recipes
+from scripts.recipes_recommend import (get_recipe_recommender, read_recipes, RecipeFilters,
+                                       RECIPE_FILTERS_PATH)
 
 # Set page config
 st.set_page_config(page_title="Recipe Recommendations", layout="wide")
@@ -87,11 +87,32 @@ st.markdown("""
         }
     </style>
 """, unsafe_allow_html=True)
-def extract_image_urls(image_str):
-    """Extract image URLs from the 'c(\"...\")' format."""
-    if isinstance(image_str, str):
-        image_urls = re.findall(r'"(https?://[^\s]+)"', image_str)
-        return image_urls
+@st.cache_resource
+def get_recipes_recommender():
+    """Share one RecipeRecommender (model and embeddings loaded once) across reruns and sessions."""
+    return get_recipe_recommender()
+
+@st.cache_data
+def get_recipe_options(nutrient_keys):
+    """
+    Slider ranges and category choices of the sidebar, read without loading the recommender.
+    Args:
+        nutrient_keys (tuple): Nutrient columns of the sliders
+    Returns:
+        tuple: (nutrient -> (min, max), sorted recipe categories)
+    """
+    df = read_recipes(columns=list(nutrient_keys))
+    ranges = {key: (float(df[key].min()), float(df[key].max())) for key in nutrient_keys}
+    if os.path.exists(RECIPE_FILTERS_PATH):
+        categories = RecipeFilters.load().values["RecipeCategory"]
+    else:
+        categories = read_recipes(columns=["RecipeCategory"])["RecipeCategory"].dropna().unique()
+    return ranges, sorted(value for value in categories if value)
+
+def extract_image_urls(images):
+    """Image URLs of a recipe's Images list."""
+    if isinstance(images, list):
+        return [url for url in images if url and url.startswith(("http://", "https://"))]
     return []
 
 def show_nutrition_pie_chart(recipe):
@@ -181,21 +202,16 @@ def show_nutrition_pie_chart(recipe):
     # Display the chart
     st.pyplot(fig)
 
-def format_recipe_instructions(instructions_str):
-    """Format recipe instructions into clean, readable steps."""
-    if not isinstance(instructions_str, str):
+def format_recipe_instructions(instructions):
+    """Format recipe instructions (a list of steps) into clean, readable steps."""
+    if not isinstance(instructions, list):
         return None
-        
-    # Clean up the string
-    instructions = (instructions_str
-                   .replace('c(', '')
-                   .replace(')"', '')
-                   .replace('"', '')
-                   .strip())
-    
-    # Split into steps and clean each step
+
+    # Clean each step
     steps = []
-    for step in instructions.split('.,'):  # Split on period-comma combination
+    for step in instructions:
+        if step is None:
+            continue
         # Clean the step text
         step = step.strip()
         # Remove any leading/trailing periods
@@ -295,21 +311,13 @@ def display_recipe_instructions(instructions):
     # Display all steps at once in the container
     st.markdown(steps_html, unsafe_allow_html=True)
 
-def format_recipe_ingredients(ingredients_str):
-    """Format recipe ingredients into a clean list."""
-    if not isinstance(ingredients_str, str):
+def format_recipe_ingredients(ingredients):
+    """Format recipe ingredients (a list) into a clean list."""
+    if not isinstance(ingredients, list):
         return None
-        
-    # Clean up the string
-    ingredients = (ingredients_str
-                  .replace('c(', '')
-                  .replace(')"', '')
-                  .replace('("', '')
-                  .replace('"', '')
-                  .strip())
-    
-    # Split and clean ingredients
-    return [ing.strip().capitalize() for ing in ingredients.split(',') if ing.strip()]
+
+    # Clean ingredients
+    return [ing.strip().capitalize() for ing in ingredients if ing and ing.strip()]
 
 def display_recipe_ingredients(ingredients):
     """Display recipe ingredients with compact capsule-shaped formatting."""
@@ -463,9 +471,6 @@ def recipes_recommendation_sidebar():
         if 'selected_foods' in st.session_state:
             display_selected_foods(st.session_state.selected_foods)
         
-        # Load dataset for slider min-max values
-        df = pd.read_csv("data/preprocessed/recipes.csv")
-
         user_data = st.session_state['user_data']
         diet_preference = user_data.get('food_preference', None)
         selected_foods = st.session_state['selected_foods']
@@ -486,6 +491,8 @@ def recipes_recommendation_sidebar():
             ("Protein", "ProteinContent")
         ]
 
+        # Slider ranges and categories come from a light read; the recommender loads on the first search
+        nutrient_ranges, recipe_categories = get_recipe_options(tuple(key for _, key in nutrients))
         user_nutrients = {}
 
         for display_name, key in nutrients:
@@ -498,13 +505,19 @@ def recipes_recommendation_sidebar():
             with cols[1]:
                 user_nutrients[key] = st.slider(
                     "##",  # Hidden label
-                    min_value=float(df[key].min()),
-                    max_value=float(df[key].max()),
-                    value=float(df[key].min()),
+                    min_value=nutrient_ranges[key][0],
+                    max_value=nutrient_ranges[key][1],
+                    value=nutrient_ranges[key][0],
                     step=0.1,
                     label_visibility="collapsed"  # This ensures the label is hidden
                 )
 
+        # Optional metadata filters, answered by the recommender's filter index
+        st.sidebar.markdown("### Recipe Filters")
+        categories = st.sidebar.multiselect("Categories", recipe_categories)
+        max_cook_minutes = st.sidebar.number_input("Max cook time (min, 0 = any)", min_value=0, value=0, step=5)
+        min_rating = st.sidebar.slider("Min rating", min_value=0.0, max_value=5.0, value=0.0, step=0.5)
+
         if st.sidebar.button("Find Recipes"):
             if not diet_preference or any(value is None for value in user_nutrients.values()):
                 st.warning("Please select your dietary preferences and adjust the sliders before proceeding.")
@@ -514,7 +527,12 @@ def recipes_recommendation_sidebar():
                 st.error("No ingredients found. Please get food recommendations first.")
                 return
 
-            st.session_state["recommended_recipes"] = recommend_recipes(user_nutrients, selected_foods, diet_preference)
+            st.session_state["recommended_recipes"] = get_recipes_recommender().recommend(
+                user_nutrients, selected_foods, diet_preference,
+                recipe_categories=categories or None,
+                max_cook_minutes=max_cook_minutes or None,
+                min_rating=min_rating or None
+            )
 
         # Ensure recipes persist across reruns
         recommended_recipes = st.session_state.get("recommended_recipes", [])
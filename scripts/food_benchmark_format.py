@@ -0,0 +1,43 @@
+import timeit
+import numpy as np
+import pandas as pd
+from food_recommend import format_recommendations, ORIGINAL_FOOD_DATA_PATH
+
+# Micro-benchmark: vectorized format_recommendations against the original iterrows loop
+
+
+def format_recommendations_iterrows(recommended_items, selected_deficiencies):
+    """The original row-by-row implementation, kept here as the baseline."""
+    formatted_data = {}
+    for _, row in recommended_items.iterrows():
+        main_cat = row['main_category']
+        sub_cat = row['sub_category']
+        nutrient_values = {nutrient: row[nutrient] for nutrient in selected_deficiencies}
+        formatted_data.setdefault(main_cat, {}).setdefault(sub_cat, []).append({
+            "food_name": row['description'],
+            "nutrients": nutrient_values
+        })
+    return [
+        {"main_category": main_cat,
+         "sub_categories": [{"name": sub_cat, "foods": foods} for sub_cat, foods in sub_cats.items()]}
+        for main_cat, sub_cats in formatted_data.items()
+    ]
+
+
+original_df = pd.read_csv(ORIGINAL_FOOD_DATA_PATH)
+deficiencies = ["vitamin_C", "iron", "zinc"]
+rng = np.random.default_rng(0)
+
+print(f"{'k':>6} {'iterrows':>12} {'vectorized':>12} {'speedup':>8}")
+for k in [40, 400, 4000]:
+    # Neighbour results are arbitrary catalog rows, possibly repeated for large k
+    recommended_items = original_df.iloc[rng.integers(0, len(original_df), size=k)]
+    assert format_recommendations(recommended_items, deficiencies) == \
+        format_recommendations_iterrows(recommended_items, deficiencies)
+
+    number = max(1, 4000 // k)
+    baseline = min(timeit.repeat(lambda: format_recommendations_iterrows(recommended_items, deficiencies),
+                                 number=number, repeat=5)) / number
+    vectorized = min(timeit.repeat(lambda: format_recommendations(recommended_items, deficiencies),
+                                   number=number, repeat=5)) / number
+    print(f"{k:>6} {baseline * 1000:>10.2f}ms {vectorized * 1000:>10.2f}ms {baseline / vectorized:>7.1f}x")
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import timeit
+import numpy as np
+from food_recommend import FoodIndex, FOOD_INDEX_PATH, FOOD_INDEX_VERSION, NUTRIENTS, save_food_index
+
+# Micro-benchmark: weighted scoring kernel (one matrix-vector product + argpartition top-k)
+# on the real catalog and on synthetic catalogs, to check it scales linearly with rows
+
+weights = np.zeros(len(NUTRIENTS))
+weights[NUTRIENTS.index("iron")] = 3       # severe iron deficiency
+weights[NUTRIENTS.index("zinc")] = 1       # mild zinc deficiency
+weights[NUTRIENTS.index("sodium")] = -2    # keep sodium low
+weights[NUTRIENTS.index("cholesterol")] = -1
+
+
+def time_index(index):
+    number = 200 if len(index.row_ids) < 100_000 else 10
+    seconds = min(timeit.repeat(lambda: index.top_scores(weights, index.all_rows), number=number, repeat=5)) / number
+    rows = len(index.row_ids)
+    print(f"{rows:>10} {seconds * 1000:>9.3f}ms {seconds / rows * 1e9:>8.2f}ns/row")
+
+
+print(f"{'rows':>10} {'top-40':>11} {'per row':>12}")
+time_index(FoodIndex(FOOD_INDEX_PATH))
+
+rng = np.random.default_rng(0)
+with tempfile.TemporaryDirectory() as index_dir:
+    for rows in [10_000, 100_000, 1_000_000]:
+        save_food_index(rng.random((rows, len(NUTRIENTS)), dtype=np.float32), {
+            "format_version": FOOD_INDEX_VERSION,
+            "n_neighbors": 40,
+            "nutrients": NUTRIENTS,
+            "scaler": {"min": [0.0] * len(NUTRIENTS), "max": [1.0] * len(NUTRIENTS)},
+            "row_ids": list(range(rows)),
+            "category_offsets": {"all": [0, rows]},
+            "partitions": {},
+        }, index_dir)
+        time_index(FoodIndex(os.path.join(index_dir, "manifest.json")))
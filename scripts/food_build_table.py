@@ -0,0 +1,32 @@
+import argparse
+import os
+import time
+from food_recommend import FoodRecommender, save_answer_table, ANSWER_TABLE_PATH
+
+# Precompute the recommendations for every deficiency combination the food page can send.
+# Run after food_train_model.py; the engine ignores the table once the data or model changes.
+parser = argparse.ArgumentParser(description="Build the food recommendation answer table.")
+parser.add_argument("--max-deficiencies", type=int, default=3,
+                    help="largest deficiency combination to precompute (the food page allows 3)")
+parser.add_argument("--output", default=ANSWER_TABLE_PATH)
+args = parser.parse_args()
+
+# Build from the catalog and model only, never from a previous table
+recommender = FoodRecommender(answer_table_path=None)
+
+start = time.perf_counter()
+table = recommender.build_answer_table(max_deficiencies=args.max_deficiencies)
+build_seconds = time.perf_counter() - start
+save_answer_table(table, args.output)
+
+# Size report, to keep an eye on the footprint as the catalog grows
+entries = len(table["entry_mask"])
+in_memory = sum(array.nbytes for array in table.values())
+print(f"✅ Answer table saved as '{args.output}'.")
+print(f"   catalog rows:     {len(recommender.df)}")
+print(f"   partitions:       {', '.join(p or 'all' for p in table['partitions'])}")
+print(f"   entries:          {entries} (subsets of up to {args.max_deficiencies} nutrients)")
+print(f"   neighbours:       {len(table['indices'])} ({len(table['indices']) / entries:.1f} per entry)")
+print(f"   build time:       {build_seconds:.2f} s")
+print(f"   size in memory:   {in_memory / 1024:.1f} KB")
+print(f"   size on disk:     {os.path.getsize(args.output) / 1024:.1f} KB")
@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from food_preprocess import clean_food_data, nutrients, FOOD_ADDITIONS_PATH
+from food_recommend import (FOOD_DATA_PATH, ORIGINAL_FOOD_DATA_PATH, FOOD_INDEX_PATH, ANSWER_TABLE_PATH,
+                            save_food_index, read_answer_table, save_answer_table, extend_answer_table,
+                            answer_table_is_stale, extend_neighbor_graph, file_hash)
+
+# Add foods to the catalog without re-running food_preprocess.py and food_train_model.py.
+# New rows are scaled with the stored scaler range and spliced into the existing index and answer table.
+# They are also kept in data/food_additions.csv, which food_preprocess.py merges into the rebuilt catalog.
+parser = argparse.ArgumentParser(description="Append foods to the catalog and update the index incrementally.")
+parser.add_argument("path", help="CSV or XLSX file with the same columns as data/food_data.xlsx")
+args = parser.parse_args()
+
+start = time.perf_counter()
+
+if args.path.endswith((".xlsx", ".xls")):
+    raw_df = pd.read_excel(args.path)
+else:
+    raw_df = pd.read_csv(args.path)
+new_df = clean_food_data(raw_df)
+
+# Keep the catalog's column layout
+catalog_columns = pd.read_csv(ORIGINAL_FOOD_DATA_PATH, nrows=0).columns
+missing = [column for column in catalog_columns if column not in new_df.columns]
+if missing:
+    raise SystemExit(f"❌ '{args.path}' is missing columns: {', '.join(missing)}")
+new_df = new_df[catalog_columns]
+
+# Foods already in the catalog (or repeated in the file) are skipped, so ingesting a file twice is harmless
+catalog_descriptions = pd.read_csv(ORIGINAL_FOOD_DATA_PATH, usecols=["description"])["description"]
+known = set(catalog_descriptions)
+duplicate = new_df["description"].isin(known) | new_df["description"].duplicated()
+if duplicate.any():
+    print(f"⚠️ Skipping {int(duplicate.sum())} foods already in the catalog: "
+          f"{', '.join(new_df.loc[duplicate, 'description'].astype(str).head(5))}"
+          f"{', ...' if duplicate.sum() > 5 else ''}")
+    new_df = new_df[~duplicate].reset_index(drop=True)
+if new_df.empty:
+    raise SystemExit("❌ No new foods to ingest.")
+
+with open(FOOD_INDEX_PATH) as manifest_file:
+    manifest = json.load(manifest_file)
+if manifest["nutrients"] != nutrients:
+    raise SystemExit("❌ The food index was built for other nutrients, re-run food_train_model.py.")
+# New rows are numbered after the indexed ones, which must be the catalogs' rows
+catalog_sizes = {len(catalog_descriptions), len(pd.read_csv(FOOD_DATA_PATH, usecols=["description"]))}
+if catalog_sizes != {len(manifest["row_ids"])}:
+    raise SystemExit(f"❌ The food index covers {len(manifest['row_ids'])} foods but the catalog has "
+                     f"{' / '.join(map(str, sorted(catalog_sizes)))}, re-run food_train_model.py first.")
+
+# An answer table built from other files is already ignored by the engine; extending it and
+# re-stamping its hashes would make it trusted again, so it is dropped instead
+table = None
+if os.path.exists(ANSWER_TABLE_PATH):
+    table = read_answer_table(ANSWER_TABLE_PATH)
+    if answer_table_is_stale(table, {path: file_hash(path) for path in table["source_paths"]}):
+        print(f"⚠️ Removing the stale answer table '{ANSWER_TABLE_PATH}' (re-run food_build_table.py to rebuild it).")
+        os.remove(ANSWER_TABLE_PATH)
+        table = None
+
+# Apply the existing scaler (same as MinMaxScaler: constant columns are only shifted)
+data_min = np.asarray(manifest["scaler"]["min"])
+data_max = np.asarray(manifest["scaler"]["max"])
+data_range = np.where(data_max - data_min == 0, 1.0, data_max - data_min)
+values = new_df[nutrients].to_numpy(dtype=float)
+scaled_df = new_df.copy()
+scaled_df[nutrients] = (values - data_min) / data_range
+
+# Values outside the stored range still work, but scores are only comparable after a full rescale
+out_of_range = [nutrient for i, nutrient in enumerate(nutrients)
+                if (values[:, i] < data_min[i]).any() or (values[:, i] > data_max[i]).any()]
+if out_of_range:
+    manifest["needs_rescale"] = True
+    print(f"⚠️ New values outside the scaler range for: {', '.join(out_of_range)}.")
+    print("   Re-run food_preprocess.py and food_train_model.py when convenient to rescale the catalog "
+          f"(ingested foods are kept in '{FOOD_ADDITIONS_PATH}').")
+
+# Append to both catalogs and to the additions a full preprocess keeps; existing rows keep their positions
+row_ids = np.asarray(manifest["row_ids"], dtype=np.int64)
+new_rows = np.arange(len(row_ids), len(row_ids) + len(new_df))
+new_df.to_csv(FOOD_ADDITIONS_PATH, mode="a", header=not os.path.exists(FOOD_ADDITIONS_PATH), index=False)
+new_df.to_csv(ORIGINAL_FOOD_DATA_PATH, mode="a", header=False, index=False)
+scaled_df.to_csv(FOOD_DATA_PATH, mode="a", header=False, index=False)
+
+# Splice the new rows into their category blocks: each block keeps its rows in catalog order
+# and new categories are added in sorted order, exactly the layout a full retrain produces
+index_dir = os.path.dirname(FOOD_INDEX_PATH)
+features = np.load(os.path.join(index_dir, manifest["features"]))
+new_features = scaled_df[nutrients].to_numpy(dtype=np.float32)
+new_categories = scaled_df["main_category"].astype(str).to_numpy()
+offsets = manifest["category_offsets"]
+
+feature_blocks, row_blocks, category_offsets, position = [], [], {}, 0
+for category in sorted(set(offsets) | set(new_categories)):
+    old_start, old_end = offsets.get(category, [0, 0])
+    is_new = new_categories == category
+    feature_blocks += [features[old_start:old_end], new_features[is_new]]
+    row_blocks += [row_ids[old_start:old_end], new_rows[is_new]]
+    size = (old_end - old_start) + int(is_new.sum())
+    category_offsets[category] = [position, position + size]
+    position += size
+
+features = np.concatenate(feature_blocks)
+manifest["row_ids"] = np.concatenate(row_blocks).tolist()
+manifest["category_offsets"] = category_offsets
+
+# Link the new foods into the substitute graph, if the index has one
+arrays = {}
+if "graph_neighbors" in manifest.get("arrays", {}):
+    graph = {name: np.load(os.path.join(index_dir, manifest["arrays"][name]))
+             for name in ("graph_neighbors", "graph_distances")}
+    arrays["graph_neighbors"], arrays["graph_distances"] = extend_neighbor_graph(
+        graph["graph_neighbors"], graph["graph_distances"], features, np.asarray(manifest["row_ids"]), new_rows,
+        manifest["graph_degree"])
+save_food_index(features, manifest, index_dir, arrays=arrays)
+
+# Merge the new rows into the precomputed answers, if there is a current answer table
+if table is not None:
+    table = extend_answer_table(table, new_features, new_rows, new_categories,
+                                manifest["partitions"], manifest["n_neighbors"])
+    table["source_hashes"] = np.array([file_hash(path) for path in table["source_paths"]])
+    save_answer_table(table, ANSWER_TABLE_PATH)
+
+new_category_names = sorted(set(new_categories) - set(offsets))
+if new_category_names:
+    print(f"   New categories: {', '.join(new_category_names)} (add them to a diet in food_train_model.py if needed)")
+print(f"✅ Ingested {len(new_df)} foods in {(time.perf_counter() - start) * 1000:.0f} ms "
+      f"(catalog now has {position} foods). Running engines pick them up on reload().")
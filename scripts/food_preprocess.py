@@ -1,49 +1,105 @@
+import glob
+import os
 import pandas as pd
 from sklearn.preprocessing import MinMaxScaler
-import re
-
-# Load data
-df = pd.read_excel("data/food_data.xlsx")
-df.rename(columns={'vitamin_K_ UG': 'vitamin_K_UG', 'vitamin D _UG' : 'vitamin_D_UG', 'vitamin B_12_UG' : 'vitamin_B_12_UG'}, inplace=True)
-df.fillna(0, inplace=True)
-
-# Cleaning
-df['description'] = df['description'].apply(lambda x: x[:-5] if x.endswith(", raw") else x)
-df['main_category'] = df['main_category'].apply(lambda x: "Veg" if x == "Non Alcoholic" else x)
-df['description'] = df['description'].apply(lambda x: re.sub(r"^Game meat,\s*", "", x).capitalize())
-
-
+from food_recommend import file_hash
 
 in_mg = ['calcium_MG', 'potassium_MG', 'zinc_MG', 'vitamin_C_MG', 'iron_MG', 'magnesium_MG', 'phosphorus_MG',
-          'sodium_MG', 'copper_MG', 'vitamin_E_MG', 'thiamin_MG', 'riboflavin_MG', 'cholesterol_MG', 'Niacin_MG', 
+          'sodium_MG', 'copper_MG', 'vitamin_E_MG', 'thiamin_MG', 'riboflavin_MG', 'cholesterol_MG', 'Niacin_MG',
           'vitamin_B_6_MG', 'choline_total_MG']
 
-in_grams = ['carbohydrate_G', 'water_G', 'total_lipid_fat_G', 'protein_G', 'fatty_acids_total_saturated_G', 
-            'fiber_total_dietary_G','total_sugars_G', 'fatty_acids_total_monounsaturated_G', 
+in_grams = ['carbohydrate_G', 'water_G', 'total_lipid_fat_G', 'protein_G', 'fatty_acids_total_saturated_G',
+            'fiber_total_dietary_G','total_sugars_G', 'fatty_acids_total_monounsaturated_G',
             'fatty_acids_total_polyunsaturated_G' ]
 
 in_ug = ['vitamin_A_UG', 'vitamin_K_UG', 'folate_total_UG', 'vitamin_B_12_UG', 'selenium_UG', 'vitamin_D_UG' ]
 
 others = ['description', 'sub_category', 'main_category', 'category', 'energy (kJ)']
 
-# Convert units (grams to milligrams, micrograms to milligrams)
-df[in_grams] = df[in_grams] * 1000
-df[in_ug] = df[in_ug] / 1000
-
-df.columns = df.columns.str.replace(r'_(UG|MG|G)$', '', regex=True)
-
 # Select relevant columns (nutrients for modeling)
 nutrients = ['calcium', 'potassium', 'zinc', 'vitamin_C', 'iron', 'magnesium', 'phosphorus','sodium', 'copper',
               'vitamin_E', 'thiamin', 'riboflavin', 'cholesterol', 'Niacin', 'vitamin_B_6', 'choline_total',
               'vitamin_A', 'vitamin_K', 'folate_total', 'vitamin_B_12', 'selenium', 'vitamin_D' ]
 
-df.to_csv("data/original/food.csv",index=False) # saving after column names have changed
-#print(df.columns)
+# Foods added with food_ingest.py, already cleaned and in the catalog's column layout. They are kept
+# apart from data/food_data.xlsx so that re-running this script doesn't drop them.
+FOOD_ADDITIONS_PATH = "data/food_additions.csv"
+
+
+def read_food_data(path="data/food_data.xlsx", cache_dir="data/cache"):
+    """
+    Read the raw food sheet through a Parquet copy keyed by the sheet's content hash.
+
+    Excel parsing dominates preprocessing, so the first run converts the sheet once and
+    later runs on the same file read the columnar copy instead. Editing the sheet changes
+    its hash, which invalidates the copy. Without a Parquet engine it just reads the sheet.
+    Args:
+        path (str): Raw food sheet
+        cache_dir (str): Where the Parquet copies live
+    Returns:
+        DataFrame: Raw food rows
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(cache_dir, f"{name}-{file_hash(path)[:16]}.parquet")
+
+    try:
+        if os.path.exists(cache_path):
+            return pd.read_parquet(cache_path)
+        df = pd.read_excel(path)
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_parquet(cache_path + ".tmp", index=False)
+        os.replace(cache_path + ".tmp", cache_path)
+    except ImportError:
+        print("⚠️ No Parquet engine (pyarrow) installed, reading the Excel file without cache.")
+        return pd.read_excel(path)
+
+    # Copies of older versions of the sheet are no longer needed
+    for old_cache in glob.glob(os.path.join(cache_dir, f"{name}-*.parquet")):
+        if old_cache != cache_path:
+            os.remove(old_cache)
+    return df
+
+
+def clean_food_data(df):
+    """
+    Clean raw food rows (laid out like data/food_data.xlsx) and convert every nutrient to mg.
+    Args:
+        df (DataFrame): Raw food rows
+    Returns:
+        DataFrame: Cleaned rows with unit suffixes dropped from the column names
+    """
+    df = df.rename(columns={'vitamin_K_ UG': 'vitamin_K_UG', 'vitamin D _UG' : 'vitamin_D_UG', 'vitamin B_12_UG' : 'vitamin_B_12_UG'})
+    df = df.fillna(0)
+
+    # Cleaning
+    df['description'] = df['description'].str.removesuffix(", raw")
+    df['main_category'] = df['main_category'].replace("Non Alcoholic", "Veg")
+    df['description'] = df['description'].str.replace(r"^Game meat,\s*", "", regex=True).str.capitalize()
+
+    # Convert units (grams to milligrams, micrograms to milligrams)
+    df[in_grams] = df[in_grams] * 1000
+    df[in_ug] = df[in_ug] / 1000
+
+    df.columns = df.columns.str.replace(r'_(UG|MG|G)$', '', regex=True)
+    return df
+
+
+if __name__ == "__main__":
+    # Load data
+    df = clean_food_data(read_food_data("data/food_data.xlsx"))
+    if os.path.exists(FOOD_ADDITIONS_PATH):
+        # Ingested foods that have since been added to the sheet keep the sheet's row
+        additions = pd.read_csv(FOOD_ADDITIONS_PATH)
+        additions = additions[~additions["description"].isin(df["description"])]
+        df = pd.concat([df, additions[df.columns]], ignore_index=True)
+
+    df.to_csv("data/original/food.csv",index=False) # saving after column names have changed
+    #print(df.columns)
 
-# Normalize nutrient data using MinMaxScaler
-scaler = MinMaxScaler()
-df[nutrients] = scaler.fit_transform(df[nutrients])
+    # Normalize nutrient data using MinMaxScaler
+    scaler = MinMaxScaler()
+    df[nutrients] = scaler.fit_transform(df[nutrients])
 
-# Save the processed data
-df.to_csv("data/preprocessed/food.csv", index=False)
-print("✅ Data preprocessing complete! File saved as 'processed_food_data.csv'.")
+    # Save the processed data
+    df.to_csv("data/preprocessed/food.csv", index=False)
+    print("✅ Data preprocessing complete! File saved as 'processed_food_data.csv'.")
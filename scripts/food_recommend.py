@@ -1,128 +1,843 @@
+import os
+import glob
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, replace
+from itertools import combinations, islice
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
-import pickle
+
+# Artifacts produced by food_preprocess.py and food_train_model.py
+FOOD_DATA_PATH = "data/preprocessed/food.csv"
+ORIGINAL_FOOD_DATA_PATH = "data/original/food.csv"
+FOOD_INDEX_PATH = "models/food_index/manifest.json"
+FOOD_INDEX_VERSION = 1
+ANSWER_TABLE_PATH = "models/food_answer_table.npz"
+
+NUTRIENTS = ['calcium', 'potassium', 'zinc', 'vitamin_C', 'iron', 'magnesium', 'phosphorus', 'sodium', 'copper',
+             'vitamin_E', 'thiamin', 'riboflavin', 'cholesterol', 'Niacin', 'vitamin_B_6', 'choline_total',
+             'vitamin_A', 'vitamin_K', 'folate_total', 'vitamin_B_12', 'selenium', 'vitamin_D']
 
 def load_data():
-    """Load processed food data and trained KNN model."""
-    df = pd.read_csv("data/preprocessed/food.csv")
-    original_df = pd.read_csv("data/original/food.csv") #loading original data 
-    with open("models/knn_model.pkl", "rb") as model_file:
-        knn = pickle.load(model_file)
-    return df, knn, original_df
+    """Load processed food data and the trained food index."""
+    df = pd.read_csv(FOOD_DATA_PATH)
+    original_df = pd.read_csv(ORIGINAL_FOOD_DATA_PATH) #loading original data
+    index = FoodIndex(FOOD_INDEX_PATH)
+    return df, index, original_df
+
+
+def squared_distances(queries, matrix):
+    """
+    Squared Euclidean distances between every query and every matrix row.
+
+    Accumulated one nutrient at a time with plain element-wise arithmetic, which gives the
+    same bits whatever the array shapes. A sum() or matrix-product reduction picks its SIMD
+    path by memory alignment, so the same pair could differ in the last bit between a
+    batch, a single query and the answer table, and flip near-ties.
+    """
+    squared = np.zeros((len(queries), len(matrix)), dtype=np.float32)
+    for column in range(matrix.shape[1]):
+        squared += (matrix[:, column][None, :] - queries[:, column][:, None]) ** 2
+    return squared
+
+
+class FoodIndex:
+    """
+    Nutrient feature matrix written by food_train_model.py.
+
+    The float32 matrix is memory-mapped read-only, so every worker process shares the
+    same page-cached copy and opening it costs next to nothing. The JSON manifest next
+    to it gives the nutrient order, scaler range, catalog row of every matrix row and
+    the contiguous block of rows of each main category.
+    """
+
+    def __init__(self, manifest_path=FOOD_INDEX_PATH):
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("format_version") != FOOD_INDEX_VERSION:
+            raise ValueError(f"Food index '{manifest_path}' has format version {manifest.get('format_version')}, "
+                             f"expected {FOOD_INDEX_VERSION}. Re-run food_train_model.py.")
+        if manifest["nutrients"] != NUTRIENTS:
+            raise ValueError(f"Food index '{manifest_path}' was built for other nutrients. Re-run food_train_model.py.")
+
+        self.manifest = manifest
+        index_dir = os.path.dirname(manifest_path)
+        self.features = np.load(os.path.join(index_dir, manifest["features"]), mmap_mode='r')
+        # Companion arrays, e.g. the food-to-food neighbour graph (absent in indexes trained without it)
+        self.arrays = {name: np.load(os.path.join(index_dir, file_name), mmap_mode='r')
+                       for name, file_name in manifest.get("arrays", {}).items()}
+        self.row_ids = np.asarray(manifest["row_ids"], dtype=np.int64)
+        self.n_neighbors = manifest["n_neighbors"]
+        self.scaler_min = np.asarray(manifest["scaler"]["min"])
+        self.scaler_max = np.asarray(manifest["scaler"]["max"])
+        offsets = manifest["category_offsets"]
+        # Blocks of matrix rows each diet searches; the global index is the whole matrix
+        self.partitions = {diet: [tuple(offsets[category]) for category in categories]
+                           for diet, categories in manifest["partitions"].items()}
+        self.all_rows = [(0, len(self.row_ids))]
+
+    def search(self, samples, blocks, k=None, block_bytes=8 << 20):
+        """
+        Exact Euclidean nearest-neighbour search over some blocks of the matrix.
+
+        A query gets bit-identical distances whether it is searched alone or in a batch
+        (see `squared_distances`).
+        Args:
+            samples (array-like): Query vectors, one row per query
+            blocks (list): (start, end) matrix rows to search
+            k (int, optional): Number of neighbours, defaults to the trained n_neighbors
+            block_bytes (int): Scratch memory budget, queries are processed in groups that fit
+        Returns:
+            list: (catalog indices, distances) per query, nearest first, ties broken by catalog row
+        """
+        samples = np.atleast_2d(np.asarray(samples, dtype=np.float32))
+        candidates = np.concatenate([np.arange(start, end) for start, end in blocks])
+        k = min(k or self.n_neighbors, len(candidates))
+        if k == 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in samples]
+
+        matrices = [self.features[start:end] for start, end in blocks]
+        step = max(1, block_bytes // (8 * len(candidates)))
+        results = []
+        for first in range(0, len(samples), step):
+            queries = samples[first:first + step]
+            squared = np.hstack([squared_distances(queries, matrix) for matrix in matrices])
+            # Everything up to the k-th smallest distance, so ties at the cut are decided by catalog row too
+            kth = np.partition(squared, k - 1, axis=1)[:, k - 1]
+            for row_squared, row_kth in zip(squared, kth):
+                row_top = np.flatnonzero(row_squared <= row_kth)
+                catalog_rows = self.row_ids[candidates[row_top]]
+                distances = np.sqrt(row_squared[row_top])
+                order = np.lexsort((catalog_rows, distances))[:k]
+                results.append((catalog_rows[order], distances[order]))
+        return results
+
+    def top_scores(self, weights, blocks, k=None, block_bytes=8 << 20):
+        """
+        Highest scoring rows for one or more nutrient weight vectors.
+
+        A food's score is the weighted sum of its scaled nutrients, so one matrix product
+        scores every row and `np.argpartition` picks the top k without sorting the rest.
+        Args:
+            weights (array-like): Signed weights in NUTRIENTS order, one row per query
+            blocks (list): (start, end) matrix rows to score
+            k (int, optional): Number of foods, defaults to the trained n_neighbors
+            block_bytes (int): Scratch memory budget, queries are processed in groups that fit
+        Returns:
+            list: (catalog indices, scores) per query, best first, ties broken by catalog row
+        """
+        weights = np.atleast_2d(np.asarray(weights, dtype=np.float32))
+        candidates = np.concatenate([np.arange(start, end) for start, end in blocks])
+        k = min(k or self.n_neighbors, len(candidates))
+        if k == 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in weights]
+
+        matrices = [self.features[start:end] for start, end in blocks]
+        step = max(1, block_bytes // (4 * len(candidates)))
+        results = []
+        for first in range(0, len(weights), step):
+            scores = np.hstack([weights[first:first + step] @ matrix.T for matrix in matrices])
+            for row_scores in scores:
+                top = np.argpartition(row_scores, len(row_scores) - k)[-k:] if k < len(candidates) else np.arange(k)
+                catalog_rows = self.row_ids[candidates[top]]
+                order = np.lexsort((catalog_rows, -row_scores[top]))
+                results.append((catalog_rows[order], row_scores[top][order]))
+        return results
+
+
+def save_food_index(features, manifest, index_dir=os.path.dirname(FOOD_INDEX_PATH), arrays=None):
+    """
+    Write a food index: the feature matrix, optional companion arrays and its manifest.
+
+    Array file names carry their content hash, so workers still mapping the previous
+    files are never affected: they are replaced by new files, not overwritten, and the
+    manifest that points to them is swapped in last.
+    Args:
+        features (ndarray): float32 matrix, rows grouped by main category
+        manifest (dict): Everything but the "features", "shape" and "arrays" entries, which are filled in here
+        arrays (dict, optional): Name -> ndarray stored next to the matrix, e.g. the neighbour graph
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    files = {}
+    for name, array in {"features": features, **(arrays or {})}.items():
+        array = np.ascontiguousarray(array)
+        files[name] = f"{name}-{hashlib.sha256(array.tobytes()).hexdigest()[:16]}.npy"
+        np.save(os.path.join(index_dir, files[name] + ".tmp.npy"), array)
+        os.replace(os.path.join(index_dir, files[name] + ".tmp.npy"), os.path.join(index_dir, files[name]))
+
+    manifest = {**manifest, "features": files.pop("features"), "shape": list(features.shape), "arrays": files}
+    manifest_path = os.path.join(index_dir, os.path.basename(FOOD_INDEX_PATH))
+    with open(manifest_path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    # Old files can go; processes still mapping them keep their pages until they reload
+    current = {manifest["features"], *files.values()}
+    for old_file in glob.glob(os.path.join(index_dir, "*.npy")):
+        if os.path.basename(old_file) not in current:
+            os.remove(old_file)
+
+
+def _nearest_rows(queries, query_rows, by_row, degree, block_bytes=8 << 20):
+    """
+    The `degree` nearest catalog rows of some catalog rows, leaving out the row itself.
+    Args:
+        queries (ndarray): Feature vectors of the query rows
+        query_rows (ndarray): Their catalog positions
+        by_row (ndarray): Feature matrix in catalog order
+        degree (int): Neighbours per row
+    Returns:
+        tuple: (int32 neighbours, float32 distances), one row per query, nearest first, ties broken by catalog row
+    """
+    neighbors = np.empty((len(queries), degree), dtype=np.int32)
+    distances = np.empty((len(queries), degree), dtype=np.float32)
+    if degree == 0:
+        return neighbors, distances
+    step = max(1, block_bytes // (8 * len(by_row)))
+    for first in range(0, len(queries), step):
+        squared = squared_distances(queries[first:first + step], by_row)
+        squared[np.arange(len(squared)), query_rows[first:first + step]] = np.inf
+        kth = np.partition(squared, degree - 1, axis=1)[:, degree - 1]
+        for local, (row_squared, row_kth) in enumerate(zip(squared, kth)):
+            row_top = np.flatnonzero(row_squared <= row_kth)
+            order = np.lexsort((row_top, row_squared[row_top]))[:degree]
+            neighbors[first + local] = row_top[order]
+            distances[first + local] = np.sqrt(row_squared[row_top[order]])
+    return neighbors, distances
+
+
+def build_neighbor_graph(features, row_ids, degree):
+    """
+    Precompute the food-to-food k-nearest-neighbour graph over the whole catalog.
+
+    Row i of both arrays belongs to catalog row i, so the substitutes of a food are a
+    single row lookup. Identical foods are kept as each other's neighbours, only a food
+    itself is left out.
+    Args:
+        features (ndarray): Index feature matrix, rows grouped by main category
+        row_ids (ndarray): Catalog row of each matrix row
+        degree (int): Neighbours kept per food
+    Returns:
+        tuple: (int32 neighbours, float32 distances), shape (catalog size, degree)
+    """
+    by_row = np.asarray(features, dtype=np.float32)[np.argsort(row_ids)]
+    degree = min(degree, len(by_row) - 1)
+    return _nearest_rows(by_row, np.arange(len(by_row)), by_row, degree)
+
+
+def extend_neighbor_graph(neighbors, distances, features, row_ids, new_rows, degree):
+    """
+    Add catalog rows appended after the graph was built.
+
+    New foods get a full search; existing foods only compare themselves against the new
+    ones, which gives the same graph as `build_neighbor_graph` on the whole catalog.
+    Args:
+        neighbors (ndarray): Current adjacency, one row per old catalog row
+        distances (ndarray): Matching distances
+        features (ndarray): Updated index feature matrix, new rows included
+        row_ids (ndarray): Updated catalog row of each matrix row
+        new_rows (ndarray): Catalog positions of the new rows
+        degree (int): Neighbours kept per food
+    Returns:
+        tuple: Updated (neighbours, distances)
+    """
+    by_row = np.asarray(features, dtype=np.float32)[np.argsort(row_ids)]
+    new_rows = np.asarray(new_rows, dtype=np.int64)
+    degree = min(degree, len(by_row) - 1)
+    new_neighbors, new_distances = _nearest_rows(by_row[new_rows], new_rows, by_row, degree)
+
+    old_count = len(neighbors)
+    to_new = np.sqrt(squared_distances(by_row[:old_count], by_row[new_rows]))
+    merged_neighbors = np.empty((old_count, degree), dtype=np.int32)
+    merged_distances = np.empty((old_count, degree), dtype=np.float32)
+    for row in range(old_count):
+        row_neighbors = np.concatenate([neighbors[row], new_rows])
+        row_distances = np.concatenate([distances[row], to_new[row]])
+        order = np.lexsort((row_neighbors, row_distances))[:degree]
+        merged_neighbors[row] = row_neighbors[order]
+        merged_distances[row] = row_distances[order]
+    return np.vstack([merged_neighbors, new_neighbors]), np.vstack([merged_distances, new_distances])
+
+
+def file_hash(path):
+    """Return the sha256 hex digest of a file, read in 1 MB blocks (None if it doesn't exist)."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def deficiency_mask(positions):
+    """Encode nutrient positions as a bitmask, the key of the answer table."""
+    mask = 0
+    for position in positions:
+        mask |= 1 << position
+    return mask
+
+
+@dataclass(frozen=True)
+class _FoodIndexState:
+    """Immutable snapshot of everything a query needs. Swapped as a whole on reload."""
+    df: pd.DataFrame
+    original_df: pd.DataFrame
+    catalog: pd.DataFrame
+    food_rows: dict
+    main_categories: np.ndarray
+    nutrient_values: np.ndarray
+    index: FoodIndex
+    nutrient_positions: dict
+    categories: list
+    answer_table: dict
+    answer_table_max: int
+    signature: dict
+    hashes: dict
+
+
+class FoodRecommender:
+    """
+    Process-resident food recommendation engine.
+
+    Loads the food catalog and the memory-mapped food index once and keeps them around,
+    so individual queries only pay for the neighbour search and the formatting.
+    Each diet with its own partition (see food_train_model.py) searches only its rows,
+    any other preference searches the whole catalog.
+    Queries read a single immutable snapshot, so `reload()` can swap in freshly
+    trained artifacts without blocking or disturbing queries that are in flight.
+    If a precomputed answer table (see food_build_table.py) matching the current
+    artifacts exists, in-table queries skip the neighbour search entirely.
+    """
+
+    def __init__(self, artifact_paths=None, answer_table_path=ANSWER_TABLE_PATH):
+        """
+        Args:
+            artifact_paths (list, optional): Files whose changes trigger a reload.
+                Defaults to the preprocessed catalog, the original catalog and the index manifest
+                (which names the feature matrix by content hash, so it changes with it).
+            answer_table_path (str, optional): Precomputed answer table, used if present
+        """
+        self.artifact_paths = artifact_paths or [FOOD_DATA_PATH, ORIGINAL_FOOD_DATA_PATH, FOOD_INDEX_PATH]
+        self.answer_table_path = answer_table_path
+        self._reload_lock = threading.Lock()
+        self._state = self._load_state()
+
+    @property
+    def _watched_paths(self):
+        return self.artifact_paths + ([self.answer_table_path] if self.answer_table_path else [])
+
+    def _artifact_signature(self):
+        """Cheap change detector: (mtime, size) of every artifact, None for missing optional files."""
+        signature = {}
+        for path in self._watched_paths:
+            if path == self.answer_table_path and not os.path.exists(path):
+                signature[path] = None
+                continue
+            stat = os.stat(path)
+            signature[path] = (stat.st_mtime_ns, stat.st_size)
+        return signature
+
+    def _load_state(self):
+        """Read all artifacts from disk and build a new query snapshot."""
+        signature = self._artifact_signature()
+        hashes = {path: file_hash(path) for path in self._watched_paths}
+        df, index, original_df = load_data()
+        descriptions = original_df["description"].astype(str).str.strip().str.lower()
+        state = _FoodIndexState(
+            df=df,
+            original_df=original_df,
+            # Only the columns recommendations show, consolidated so row lookups are cheap
+            catalog=original_df[['description', 'main_category', 'sub_category'] + NUTRIENTS].copy(),
+            # Food name -> catalog row (first one for duplicate names), for substitute lookups
+            food_rows=dict(zip(descriptions[~descriptions.duplicated()], np.flatnonzero(~descriptions.duplicated()))),
+            main_categories=original_df["main_category"].astype(str).to_numpy(),
+            nutrient_values=original_df[NUTRIENTS].to_numpy(dtype=float),
+            index=index,
+            nutrient_positions={nutrient: i for i, nutrient in enumerate(NUTRIENTS)},
+            categories=df["main_category"].unique().tolist(),
+            answer_table={},
+            answer_table_max=-1,
+            signature=signature,
+            hashes=hashes,
+        )
+        if self.answer_table_path and hashes[self.answer_table_path]:
+            answer_table, answer_table_max = load_answer_table(self.answer_table_path, hashes)
+            state = replace(state, answer_table=answer_table, answer_table_max=answer_table_max)
+        return state
+
+    @property
+    def df(self):
+        return self._state.df
+
+    @property
+    def original_df(self):
+        return self._state.original_df
+
+    @property
+    def categories(self):
+        return self._state.categories
+
+    @property
+    def source_hashes(self):
+        """Hashes of the catalog and model files the current snapshot was built from."""
+        return {path: self._state.hashes[path] for path in self.artifact_paths}
+
+    def reload(self, force=False):
+        """
+        Reload the artifacts if they changed on disk.
+
+        Files whose mtime or size moved are re-hashed, so a `touch` without a content
+        change does not trigger a rebuild. The new snapshot is built off to the side and
+        swapped in with a single assignment; queries already running keep the old one.
+        Args:
+            force (bool): Reload even if no change is detected
+        Returns:
+            bool: True if a new snapshot was swapped in
+        """
+        with self._reload_lock:
+            state = self._state
+            signature = self._artifact_signature()
+            if not force:
+                if signature == state.signature:
+                    return False
+                changed = [path for path in self._watched_paths if signature[path] != state.signature.get(path)]
+                if all(file_hash(path) == state.hashes.get(path) for path in changed):
+                    # Only metadata changed, remember the new signature so we don't re-hash next time
+                    self._state = replace(state, signature=signature)
+                    return False
+            self._state = self._load_state()
+            return True
+
+    def partition_keys(self):
+        """Indexes a query can be routed to; None stands for the global index."""
+        return [None] + list(self._state.index.partitions)
+
+    def _partition_key(self, state, category):
+        return category if category in state.index.partitions else None
+
+    def _search(self, state, samples, category=None):
+        """
+        Run the neighbour search for a matrix of query vectors.
+        Args:
+            state (_FoodIndexState): Snapshot to search
+            samples (ndarray): Query vectors, one row per query
+            category (str, optional): Diet preference, routed to its own index if it has one
+        Returns:
+            list: (indices, distances) per query, indices into the catalog
+        """
+        index = state.index
+        return index.search(samples, index.partitions.get(category, index.all_rows))
+
+    def _query_positions(self, state, deficiencies):
+        """
+        Validate a deficiency list.
+        Returns:
+            tuple: (set of nutrient positions, None) or (None, error message)
+        """
+        if not isinstance(deficiencies, list):
+            return None, "Invalid input. Provide a list of deficiencies."
+
+        # Check for invalid deficiencies
+        invalid_nutrients = [d for d in deficiencies if d not in state.nutrient_positions]
+        if invalid_nutrients:
+            return None, f"Invalid deficiencies: {', '.join(invalid_nutrients)}. Choose from: {', '.join(NUTRIENTS)}"
 
+        return {state.nutrient_positions[deficiency] for deficiency in deficiencies}, None
 
+    def _query_weights(self, state, weights):
+        """
+        Validate nutrient weights.
+        Returns:
+            tuple: (weight vector in NUTRIENTS order, None) or (None, error message)
+        """
+        if not isinstance(weights, dict):
+            return None, "Invalid weights. Provide a mapping of nutrient to weight."
 
+        invalid_nutrients = [n for n in weights if n not in state.nutrient_positions]
+        if invalid_nutrients:
+            return None, f"Invalid weights: {', '.join(invalid_nutrients)}. Choose from: {', '.join(NUTRIENTS)}"
+
+        vector = np.zeros(len(NUTRIENTS))
+        for nutrient, weight in weights.items():
+            vector[state.nutrient_positions[nutrient]] = weight
+        return vector, None
+
+    def _format(self, state, indices, deficiencies, category, weights=None):
+        # Extract recommendations from the original dataset
+        recommended_items = state.catalog.iloc[indices]
+
+        if recommended_items.empty:
+            return {"error": f"No valid food recommendations available for the selected category: {category}"}
+
+        # Weighted queries also show the nutrients they weigh, e.g. the sodium they keep low
+        shown = deficiencies + [n for n in weights or {} if n not in deficiencies]
+        return format_recommendations(recommended_items, shown)
+
+    def recommend(self, deficiencies, category=None, weights=None):
+        """
+        Recommend food items for a list of nutrient deficiencies, routed to the index of the diet preference.
+        Args:
+            deficiencies (list): Nutrients the user lacks
+            category (str, optional): Diet preference
+            weights (dict, optional): Nutrient -> signed weight, e.g. {"iron": 3, "zinc": 1, "sodium": -2}.
+                Foods are then ranked by weighted nutrient content instead of nearest neighbours.
+        """
+        return next(self.iter_recommend([{"deficiencies": deficiencies, "category": category, "weights": weights}]))
+
+    def iter_recommend(self, profiles, chunk_size=1024):
+        """
+        Recommend food items for many deficiency profiles, yielding one result per profile in order.
+
+        Profiles are consumed `chunk_size` at a time, so memory stays bounded however long
+        the input is. Within a chunk, answer-table hits are served directly and the rest
+        are stacked into one query matrix per partition, searched in a single vectorized pass.
+        Weighted profiles of a partition are likewise scored with one matrix product.
+        Args:
+            profiles (iterable): Dicts with "deficiencies" (list), optional "category" and "weights"
+            chunk_size (int): Number of profiles searched together
+        Yields:
+            Same result as `recommend` for each profile, including the error messages
+        """
+        profiles = iter(profiles)
+        while True:
+            chunk = list(islice(profiles, chunk_size))
+            if not chunk:
+                return
+            state = self._state  # one snapshot for the whole chunk
+            results = [None] * len(chunk)
+            pending = {}  # partition -> [(position in chunk, nutrient positions)]
+            pending_weighted = {}  # partition -> [(position in chunk, weight vector)]
+
+            for i, profile in enumerate(chunk):
+                deficiencies, category = profile["deficiencies"], profile.get("category")
+                positions, error = self._query_positions(state, deficiencies)
+                if error:
+                    results[i] = error
+                    continue
+                key = self._partition_key(state, category)
+                if profile.get("weights") is not None:
+                    vector, error = self._query_weights(state, profile["weights"])
+                    if error:
+                        results[i] = error
+                    else:
+                        pending_weighted.setdefault(key, []).append((i, vector))
+                    continue
+                answer = None
+                if len(positions) <= state.answer_table_max:
+                    answer = state.answer_table.get((key, deficiency_mask(positions)))
+                if answer is not None:
+                    results[i] = self._format(state, answer[0], deficiencies, category)
+                else:
+                    pending.setdefault(key, []).append((i, positions))
+
+            for key, queries in pending.items():
+                # Create query vectors: 1 for deficient nutrients, 0 for others
+                samples = np.zeros((len(queries), len(NUTRIENTS)))
+                for row, (_, positions) in enumerate(queries):
+                    samples[row, list(positions)] = 1
+                for (i, _), (indices, _) in zip(queries, self._search(state, samples, key)):
+                    profile = chunk[i]
+                    results[i] = self._format(state, indices, profile["deficiencies"], profile.get("category"))
+
+            for key, queries in pending_weighted.items():
+                index = state.index
+                weights = np.stack([vector for _, vector in queries])
+                blocks = index.partitions.get(key, index.all_rows)
+                for (i, _), (indices, _) in zip(queries, index.top_scores(weights, blocks)):
+                    profile = chunk[i]
+                    results[i] = self._format(state, indices, profile["deficiencies"], profile.get("category"),
+                                              profile["weights"])
+
+            yield from results
+
+    def recommend_batch(self, profiles, chunk_size=1024):
+        """List version of `iter_recommend`."""
+        return list(self.iter_recommend(profiles, chunk_size=chunk_size))
+
+    def recommend_substitutes(self, food_name, category=None, max_nutrients=None, k=10):
+        """
+        Foods nutritionally closest to a given food, e.g. something like spinach but lower in sodium.
+
+        Answered from the neighbour graph precomputed by food_train_model.py: only the
+        food's own row of the graph is filtered, so a query costs O(degree) whatever the
+        catalog size.
+        Args:
+            food_name (str): Catalog description of the food to replace (case-insensitive)
+            category (str, optional): Diet preference, diets with a partition only get their main categories
+            max_nutrients (dict, optional): Nutrient -> upper bound in catalog units, e.g. {"sodium": 50}
+            k (int): Number of substitutes
+        Returns:
+            Same format as `recommend`, showing the capped nutrients, or an error message
+        """
+        state = self._state
+        graph = state.index.arrays.get("graph_neighbors")
+        if graph is None:
+            return {"error": "The food index has no substitute graph. Re-run food_train_model.py."}
+
+        row = state.food_rows.get(str(food_name).strip().lower())
+        if row is None:
+            return f"Unknown food: {food_name}"
+
+        max_nutrients = max_nutrients or {}
+        invalid_nutrients = [n for n in max_nutrients if n not in state.nutrient_positions]
+        if invalid_nutrients:
+            return f"Invalid nutrient limits: {', '.join(invalid_nutrients)}. Choose from: {', '.join(NUTRIENTS)}"
+
+        neighbors = np.asarray(graph[row])
+        keep = np.ones(len(neighbors), dtype=bool)
+        allowed_categories = state.index.manifest["partitions"].get(category)
+        if allowed_categories is not None:
+            keep &= np.isin(state.main_categories[neighbors], allowed_categories)
+        if max_nutrients:
+            columns = [state.nutrient_positions[nutrient] for nutrient in max_nutrients]
+            limits = np.array(list(max_nutrients.values()), dtype=float)
+            keep &= (state.nutrient_values[np.ix_(neighbors, columns)] <= limits).all(axis=1)
+
+        indices = neighbors[keep][:k]
+        if len(indices) == 0:
+            return {"error": f"No substitutes for '{food_name}' match the selected category and nutrient limits"}
+        return format_recommendations(state.catalog.iloc[indices], list(max_nutrients))
+
+    def build_answer_table(self, max_deficiencies=3):
+        """
+        Precompute the search result of every deficiency subset up to a given size.
+
+        All subsets of a partition go through a single search call. The table is
+        laid out as flat arrays (CSR style) so it saves compactly with numpy.
+        Args:
+            max_deficiencies (int): Largest deficiency subset to enumerate
+        Returns:
+            dict: Arrays ready for `save_answer_table`
+        """
+        state = self._state
+        subsets = [subset for size in range(max_deficiencies + 1)
+                   for subset in combinations(range(len(NUTRIENTS)), size)]
+        samples = np.zeros((len(subsets), len(NUTRIENTS)))
+        for row, subset in enumerate(subsets):
+            samples[row, list(subset)] = 1
+        masks = np.array([deficiency_mask(subset) for subset in subsets], dtype=np.int64)
+
+        partitions, entry_partition, entry_mask, lengths, indices, distances = [], [], [], [], [], []
+        for partition_id, key in enumerate([None] + list(state.index.partitions)):
+            partitions.append("" if key is None else key)
+            for mask, (row_indices, row_distances) in zip(masks, self._search(state, samples, key)):
+                entry_partition.append(partition_id)
+                entry_mask.append(mask)
+                lengths.append(len(row_indices))
+                indices.append(row_indices)
+                distances.append(row_distances)
+
+        source_hashes = self.source_hashes
+        return {
+            "nutrients": np.array(NUTRIENTS),
+            "max_deficiencies": np.array(max_deficiencies),
+            "source_paths": np.array(list(source_hashes)),
+            "source_hashes": np.array(list(source_hashes.values())),
+            "partitions": np.array(partitions),
+            "entry_partition": np.array(entry_partition, dtype=np.int16),
+            "entry_mask": np.array(entry_mask, dtype=np.int64),
+            "offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            "indices": np.concatenate(indices).astype(np.int32),
+            "distances": np.concatenate(distances).astype(np.float32),
+        }
+
+
+def save_answer_table(table, path=ANSWER_TABLE_PATH):
+    """Write an answer table built by `FoodRecommender.build_answer_table`."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez_compressed(tmp_path, **table)
+    os.replace(tmp_path, path)  # atomic, a running engine never sees a half-written table
+
+
+def read_answer_table(path=ANSWER_TABLE_PATH):
+    """Read an answer table file back into the dict of arrays it was saved from."""
+    with np.load(path, allow_pickle=False) as table:
+        return dict(table)
+
+
+def answer_table_is_stale(table, hashes):
+    """
+    Whether an answer table was built from other catalog/model files (or nutrients) than the current ones.
+    Args:
+        table (mapping): Answer table arrays (an open .npz or `read_answer_table`'s dict)
+        hashes (dict): Hashes of the current artifacts, by path
+    """
+    return list(table["nutrients"]) != NUTRIENTS or any(
+        hashes.get(source_path) != source_hash
+        for source_path, source_hash in zip(table["source_paths"], table["source_hashes"]))
+
+
+def load_answer_table(path, hashes):
+    """
+    Load an answer table into a {(partition, mask): (indices, distances)} dict.
+
+    A table built from different catalog/model files than the ones currently loaded
+    is ignored, so a retrain never serves stale answers.
+    Args:
+        path (str): Answer table file
+        hashes (dict): Hashes of the currently loaded artifacts
+    Returns:
+        tuple: (lookup dict, largest deficiency subset size in the table or -1 if unusable)
+    """
+    with np.load(path, allow_pickle=False) as table:
+        if answer_table_is_stale(table, hashes):
+            print(f"⚠️ Ignoring answer table '{path}': it was built from other data or model files.")
+            return {}, -1
+        partitions = [key or None for key in table["partitions"].tolist()]
+        offsets, indices, distances = table["offsets"], table["indices"], table["distances"]
+        lookup = {}
+        for entry, (partition_id, mask) in enumerate(zip(table["entry_partition"], table["entry_mask"])):
+            start, end = offsets[entry], offsets[entry + 1]
+            lookup[(partitions[partition_id], int(mask))] = (indices[start:end], distances[start:end])
+        return lookup, int(table["max_deficiencies"])
+
+
+def extend_answer_table(table, new_features, new_rows, new_categories, partitions, n_neighbors):
+    """
+    Merge catalog rows appended after the table was built into its entries.
+
+    Each entry keeps its current neighbours and only compares its query against the
+    new rows, which gives the same table as a full rebuild at a fraction of the cost.
+    Args:
+        table (dict): Answer table arrays (see `FoodRecommender.build_answer_table`)
+        new_features (ndarray): Scaled nutrient values of the new rows
+        new_rows (ndarray): Catalog row positions of the new rows
+        new_categories (ndarray): main_category of the new rows
+        partitions (dict): Diet -> main categories, from the index manifest
+        n_neighbors (int): Neighbours kept per entry
+    Returns:
+        dict: Updated table arrays, source hashes left for the caller to refresh
+    """
+    new_features = np.asarray(new_features, dtype=np.float32)
+    new_rows = np.asarray(new_rows, dtype=np.int64)
+    offsets, indices, distances = table["offsets"], table["indices"], table["distances"]
+    partition_names = table["partitions"].tolist()
+
+    # Rows each partition can recommend, and distances from every entry's query to them
+    samples = np.zeros((len(table["entry_mask"]), len(NUTRIENTS)), dtype=np.float32)
+    for position in range(len(NUTRIENTS)):
+        samples[:, position] = (table["entry_mask"] >> position) & 1
+    new_distances = np.sqrt(squared_distances(samples, new_features))
+    allowed = {p: np.ones(len(new_rows), dtype=bool) if not name else np.isin(new_categories, partitions.get(name, []))
+               for p, name in enumerate(partition_names)}
+
+    merged_indices, merged_distances, lengths = [], [], []
+    for entry, partition_id in enumerate(table["entry_partition"]):
+        start, end = offsets[entry], offsets[entry + 1]
+        keep = allowed[int(partition_id)]
+        entry_indices = np.concatenate([indices[start:end], new_rows[keep]])
+        entry_distances = np.concatenate([distances[start:end], new_distances[entry, keep]])
+        order = np.lexsort((entry_indices, entry_distances))[:n_neighbors]
+        merged_indices.append(entry_indices[order])
+        merged_distances.append(entry_distances[order])
+        lengths.append(len(order))
+
+    return {
+        **table,
+        "offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+        "indices": np.concatenate(merged_indices).astype(np.int32),
+        "distances": np.concatenate(merged_distances).astype(np.float32),
+    }
+
+
+_recommender = None
+_recommender_lock = threading.Lock()
+
+def get_recommender():
+    """Return the process-wide FoodRecommender, loading it on first use."""
+    global _recommender
+    if _recommender is None:
+        with _recommender_lock:
+            if _recommender is None:
+                _recommender = FoodRecommender()
+    return _recommender
 
 
 def format_recommendations(recommended_items, selected_deficiencies):
     """
     Format the recommendations into a structured list of categories and food items.
+    Groups keep the order in which they first appear and foods keep their row order.
     Args:
         recommended_items (DataFrame): DataFrame containing food recommendations
         selected_deficiencies (list): List of nutrient deficiencies
     Returns:
         list: Formatted list of recommendations grouped by main and sub categories
     """
-    formatted_data = {}
-
-    # Iterate through each row in the DataFrame
-    for _, row in recommended_items.iterrows():
-        main_cat = row['main_category']
-        sub_cat = row['sub_category']
-        food_name = row['description']
-        nutrient_values = {nutrient: row[nutrient] for nutrient in selected_deficiencies}  # Extract deficiencies
+    if recommended_items.empty:
+        return []
 
-        # Create main category if it doesn't exist
-        if main_cat not in formatted_data:
-            formatted_data[main_cat] = {}
+    # Pull out only the columns the output needs, as plain arrays
+    main_cats = recommended_items['main_category'].to_numpy()
+    sub_cats = recommended_items['sub_category'].to_numpy()
+    food_names = recommended_items['description'].tolist()
+    nutrient_values = np.column_stack(
+        [recommended_items[nutrient].to_numpy() for nutrient in selected_deficiencies] or [np.empty((len(food_names), 0))]
+    ).tolist()  # Extract deficiencies
 
-        # Create sub category if it doesn't exist
-        if sub_cat not in formatted_data[main_cat]:
-            formatted_data[main_cat][sub_cat] = []
+    foods = [{"food_name": food_name, "nutrients": dict(zip(selected_deficiencies, values))}
+             for food_name, values in zip(food_names, nutrient_values)]
 
-        # Add food name and nutrients under the sub-category
-        formatted_data[main_cat][sub_cat].append({
-            "food_name": food_name,
-            "nutrients": nutrient_values
-        })
+    # Number the (main, sub) groups in order of appearance (what groupby(sort=False) does, minus
+    # its overhead) and sort rows by group, keeping row order
+    main_codes, _ = pd.factorize(main_cats, use_na_sentinel=False)
+    sub_codes, sub_uniques = pd.factorize(sub_cats, use_na_sentinel=False)
+    group_ids, _ = pd.factorize(main_codes * len(sub_uniques) + sub_codes)
+    order = np.argsort(group_ids, kind='stable')
+    starts = np.flatnonzero(np.diff(group_ids[order], prepend=-1))
+    ends = np.append(starts[1:], len(order))
 
     # Convert structured data into a list format
     formatted_list = []
-    for main_cat, sub_cats in formatted_data.items():
-        main_category = {
-            "main_category": main_cat,
-            "sub_categories": []
-        }
-
-        for sub_cat, foods in sub_cats.items():
-            sub_category = {
-                "name": sub_cat,
-                "foods": []  # List of food items
-            }
-            for food in foods:
-                sub_category["foods"].append({
-                    "food_name": food["food_name"],
-                    "nutrients": food["nutrients"]
-                })
+    main_categories = {}
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        first_row = order[start]
+        main_cat = main_cats[first_row]
 
-            main_category["sub_categories"].append(sub_category)
+        # Create main category if it doesn't exist
+        if main_cat not in main_categories:
+            main_categories[main_cat] = {"main_category": main_cat, "sub_categories": []}
+            formatted_list.append(main_categories[main_cat])
 
-        formatted_list.append(main_category)
+        main_categories[main_cat]["sub_categories"].append({
+            "name": sub_cats[first_row],
+            "foods": [foods[row] for row in order[start:end].tolist()]
+        })
 
     return formatted_list  # Ensure it returns a list of dictionaries
 
 
-    
-    
-
-def recommend_food(deficiencies, category=None):
+def recommend_food(deficiencies, category=None, weights=None):
     #Recommend food items based on a user's nutrient deficiencies, with optional category filtering.
-    df, knn,original_df = load_data()
+    #Optional weights (nutrient -> signed weight) rank foods by weighted nutrient content instead.
     print("from recommend_food: deficiencies: ", deficiencies, "category: ", category)
-    selected_deficiencies=deficiencies
-    # Define nutrients inside the function
-    nutrients = ['calcium', 'potassium', 'zinc', 'vitamin_C', 'iron', 'magnesium', 'phosphorus', 'sodium', 'copper',
-                 'vitamin_E', 'thiamin', 'riboflavin', 'cholesterol', 'Niacin', 'vitamin_B_6', 'choline_total',
-                 'vitamin_A', 'vitamin_K', 'folate_total', 'vitamin_B_12', 'selenium', 'vitamin_D']
-    
-    if not isinstance(deficiencies, list):
-        return "Invalid input. Provide a list of deficiencies."
-    
-    # Check for invalid deficiencies
-    invalid_nutrients = [d for d in deficiencies if d not in nutrients]
-    if invalid_nutrients:
-        return f"Invalid deficiencies: {', '.join(invalid_nutrients)}. Choose from: {', '.join(nutrients)}"
-       
-    # Create a query vector: 1 for deficient nutrients, 0 for others
-    sample = np.zeros(len(nutrients))
-    for deficiency in deficiencies:
-        sample[nutrients.index(deficiency)] = 1
-    
-    # Use KNN to get recommendations
-    distances, indices = knn.kneighbors([sample])
-    
-    # Extract recommendations from the full dataset first
-    #recommended_items = df.iloc[indices[0] % len(df)]  # Ensure valid indices
-    
-    #getting original values
-    #original_df= df
-    #scaler = MinMaxScaler()
-    #original_df[nutrients]= scaler.inverse_transform(df[nutrients])
-
-   # Extract recommendations from the original dataset first
-    #recommended_items = original_df.iloc[indices[0]][['description','main_category','sub_category']+ deficiencies] # Ensure valid indices
-    recommended_items = original_df.iloc[indices[0] % len(df)] 
-    #print(recommended_items)
-    #print(recommended_items2)
-    #print('columns in orignal df',original_df.columns)
-
-    # If category is 'Veg', filter the recommendations
-    if category == 'Veg':
-        recommended_items = recommended_items[recommended_items['main_category'] == category]
-    
-    if recommended_items.empty:
-        return {"error": f"No valid food recommendations available for the selected category: {category}"}
-    
-    formatted_recommendations = format_recommendations(recommended_items,selected_deficiencies)
-    return formatted_recommendations 
\ No newline at end of file
+    return get_recommender().recommend(deficiencies, category=category, weights=weights)
+
+
+def recommend_substitutes(food_name, category=None, max_nutrients=None, k=10):
+    """
+    Recommend foods with a similar nutrient profile to a given food.
+    Args:
+        food_name (str): Food to replace, as named in the catalog
+        category (str, optional): Diet preference
+        max_nutrients (dict, optional): Nutrient -> upper bound, e.g. {"sodium": 50}
+        k (int): Number of substitutes
+    Returns:
+        list: Substitutes grouped like `recommend_food`, or an error message
+    """
+    return get_recommender().recommend_substitutes(food_name, category=category, max_nutrients=max_nutrients, k=k)
+
+
+def recommend_food_batch(profiles, chunk_size=1024):
+    """
+    Recommend food items for many users at once.
+    Args:
+        profiles (iterable): Dicts with "deficiencies" (list), optional "category" and "weights"
+        chunk_size (int): Number of profiles searched together, bounds memory use
+    Returns:
+        list: One `recommend_food` result per profile, in input order
+    """
+    return get_recommender().recommend_batch(profiles, chunk_size=chunk_size)
@@ -1,9 +1,10 @@
+import numpy as np
 import pandas as pd
-from sklearn.neighbors import NearestNeighbors
-import pickle
+from food_recommend import save_food_index, build_neighbor_graph, FOOD_INDEX_VERSION
 
-# Load processed food data
+# Load processed food data, and the unscaled data to record the scaler range
 df = pd.read_csv("data/preprocessed/food.csv")
+original_df = pd.read_csv("data/original/food.csv")
 
 
 # Define features (nutrient values)
@@ -11,16 +12,59 @@ nutrients = ['calcium', 'potassium', 'zinc', 'vitamin_C', 'iron', 'magnesium', '
               'vitamin_E', 'thiamin', 'riboflavin', 'cholesterol', 'Niacin', 'vitamin_B_6', 'choline_total',
               'vitamin_A', 'vitamin_K', 'folate_total', 'vitamin_B_12', 'selenium', 'vitamin_D' ]
 
+# Main categories each diet preference may be recommended. One index is built per diet so
+# filtering happens before the search; any other preference (e.g. Non-veg) uses the global index.
+# New diets such as vegan or pescatarian only need an entry here.
+diet_categories = {
+    "Veg": ["Veg"],
+}
 
-# Prepare the feature matrix for KNN (using nutrients only)
-X = df[nutrients]
+n_neighbors = 40
 
-# Initialize and train the KNN model
-knn = NearestNeighbors(n_neighbors=40, metric='euclidean')
-knn.fit(X)
+# Neighbours stored per food in the substitute graph. Substitutes are filtered by diet and
+# nutrient limits after the lookup, so keep a margin above the number usually shown.
+graph_degree = 50
 
-# Save the trained model
-with open("models/knn_model.pkl", "wb") as model_file:
-    pickle.dump(knn, model_file)
+# The index is a float32 feature matrix plus a JSON manifest describing it
+index_dir = "models/food_index"
 
-print("✅ KNN model trained and saved as 'knn_model.pkl'.")
+# Order rows by main category so every category is one contiguous block of the matrix
+main_categories = df["main_category"].astype(str).to_numpy()
+row_ids = np.argsort(main_categories, kind="stable")
+categories, starts = np.unique(main_categories[row_ids], return_index=True)
+ends = np.append(starts[1:], len(row_ids))
+category_offsets = {category: [int(start), int(end)] for category, start, end in zip(categories, starts, ends)}
+
+# Prepare the feature matrix (using nutrients only)
+X = df[nutrients].to_numpy(dtype=np.float32)[row_ids]
+
+partitions = {}
+for diet, diet_cats in diet_categories.items():
+    diet_cats = [category for category in diet_cats if category in category_offsets]
+    if not diet_cats:
+        print(f"⚠️ No foods for diet '{diet}', skipping its index.")
+        continue
+    partitions[diet] = diet_cats
+    print(f"   {diet}: {sum(np.diff(category_offsets[c])[0] for c in diet_cats)} foods")
+
+manifest = {
+    "format_version": FOOD_INDEX_VERSION,
+    "dtype": "float32",
+    "metric": "euclidean",
+    "n_neighbors": n_neighbors,
+    "nutrients": nutrients,
+    "scaler": {
+        "min": original_df[nutrients].min().tolist(),
+        "max": original_df[nutrients].max().tolist(),
+    },
+    "row_ids": row_ids.tolist(),  # catalog row of each matrix row
+    "category_offsets": category_offsets,
+    "partitions": partitions,
+    "graph_degree": graph_degree,
+}
+
+# Food-to-food neighbour graph for substitutes, indexed by catalog row
+graph_neighbors, graph_distances = build_neighbor_graph(X, row_ids, graph_degree)
+save_food_index(X, manifest, index_dir, arrays={"graph_neighbors": graph_neighbors, "graph_distances": graph_distances})
+
+print(f"✅ Food index ({X.shape[0]} foods x {X.shape[1]} nutrients) saved to '{index_dir}'.")
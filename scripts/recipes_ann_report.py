@@ -0,0 +1,48 @@
+import argparse
+import time
+import numpy as np
+from recipes_recommend import load_recipe_embeddings, build_ann_index, cosine_similarities
+
+# Recall@k and latency of the HNSW index against brute-force search, for a few ef_search values.
+# Query recipes are held out of the index, so a query never trivially finds itself.
+parser = argparse.ArgumentParser(description="Report ANN recall@k and latency against exact search.")
+parser.add_argument("--queries", type=int, default=500, help="Number of held-out query recipes")
+parser.add_argument("--k", type=int, default=50, help="Neighbours compared (the recommender's candidate pool)")
+parser.add_argument("--M", type=int, default=16)
+parser.add_argument("--ef-construction", type=int, default=200)
+parser.add_argument("--ef-search", default="50,64,128,256", help="Comma separated values to try")
+args = parser.parse_args()
+
+embeddings, _, _ = load_recipe_embeddings()
+rng = np.random.default_rng(0)
+rows = rng.permutation(len(embeddings))
+query_rows, indexed_rows = np.sort(rows[:args.queries]), np.sort(rows[args.queries:])
+queries = np.asarray(embeddings[query_rows])
+k = min(args.k, len(indexed_rows))
+
+start = time.perf_counter()
+index = build_ann_index(embeddings, indexed_rows, M=args.M, ef_construction=args.ef_construction)
+print(f"✅ Built HNSW index over {len(indexed_rows)} recipes (M={args.M}, ef_construction={args.ef_construction}) "
+      f"in {time.perf_counter() - start:.1f} s")
+
+# Ground truth by brute force
+indexed = np.asarray(embeddings[indexed_rows])
+exact, exact_seconds = [], 0.0
+for query in queries:
+    start = time.perf_counter()
+    similarities = cosine_similarities(indexed, query)
+    exact.append(set(indexed_rows[np.argsort(-similarities, kind="stable")[:k]].tolist()))
+    exact_seconds += time.perf_counter() - start
+print(f"   exact search: {exact_seconds / len(queries) * 1000:.2f} ms/query")
+
+print(f"{'ef_search':>10} {'recall@' + str(k):>10} {'ms/query':>10} {'speedup':>8}")
+for ef_search in [int(value) for value in args.ef_search.split(",")]:
+    index.set_ef(max(ef_search, k))
+    hits, ann_seconds = 0, 0.0
+    for query, truth in zip(queries, exact):
+        start = time.perf_counter()
+        labels, _ = index.knn_query(query, k=k, num_threads=1)
+        ann_seconds += time.perf_counter() - start
+        hits += len(truth.intersection(labels[0].tolist()))
+    print(f"{max(ef_search, k):>10} {hits / (k * len(queries)):>10.4f} {ann_seconds / len(queries) * 1000:>10.3f} "
+          f"{exact_seconds / ann_seconds:>7.1f}x")
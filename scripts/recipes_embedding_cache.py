@@ -0,0 +1,191 @@
+import os
+import glob
+import hashlib
+import numpy as np
+
+EMBEDDING_CACHE_DIR = "data/cache/embeddings"
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of text embeddings, content-addressed by (model, normalized text).
+
+    Every model has its own directory, and a text is keyed by the sha256 of its normalized
+    form, so identical ingredient lists are embedded once and unchanged recipes are never
+    re-embedded. Embeddings are committed in numbered chunks, each an atomically written pair
+    of .npy files: a job that dies mid-way keeps every chunk it committed and the next run
+    resumes after them. Only the keys are held in memory; embeddings are memory-mapped from
+    the chunk files and read when they are looked up, so the cache never needs to fit in RAM.
+    """
+
+    def __init__(self, model_name, cache_dir=EMBEDDING_CACHE_DIR):
+        """
+        Args:
+            model_name (str): Model the embeddings come from, e.g. "paraphrase-MiniLM-L6-v2"
+            cache_dir (str): Root directory of the cache
+        """
+        self.model_name = model_name
+        self.cache_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+        self.dim = None
+        # All keys sorted, with the chunk and the row in the chunk of each key's embedding
+        self._keys = np.empty(0, dtype="S32")
+        self._chunks = np.empty(0, dtype=np.int32)
+        self._rows = np.empty(0, dtype=np.int64)
+        # Memory-mapped embeddings of every chunk, by chunk number, and the file name of each chunk
+        self._embeddings = []
+        self._names = []
+        # Chunks not merged into the sorted index yet, merged all at once on the next lookup
+        self._pending = []
+        # Chunks are opened in commit order, the sequence number in their name
+        self._next_sequence = 0
+        names = [os.path.basename(path)[:-len(".keys.npy")]
+                 for path in glob.glob(os.path.join(self.cache_dir, "chunk-*.keys.npy"))]
+        for name in sorted(names, key=self._sequence):
+            self._open_chunk(name)
+        # Chunks written as .npz by older versions (unnumbered, so in file time order) are
+        # rewritten once in the memory-mappable format
+        for path in sorted(glob.glob(os.path.join(self.cache_dir, "chunk-*.npz")), key=os.path.getmtime):
+            with np.load(path) as chunk:
+                self.add(chunk["keys"], chunk["embeddings"])
+            os.remove(path)
+
+    def __len__(self):
+        self._merge()
+        return len(self._keys)
+
+    @staticmethod
+    def normalize(text):
+        """Text as it is keyed and embedded: whitespace runs collapsed, ends stripped."""
+        return " ".join(str(text).split())
+
+    @staticmethod
+    def keys(texts):
+        """Cache keys (hex sha256) of already normalized texts."""
+        return np.array([hashlib.sha256(text.encode("utf-8")).hexdigest()[:32] for text in texts], dtype="S32")
+
+    def _positions(self, keys):
+        self._merge()
+        positions = np.searchsorted(self._keys, keys)
+        found = positions < len(self._keys)
+        found[found] = self._keys[positions[found]] == keys[found]
+        return positions, found
+
+    def contains(self, keys):
+        """Boolean mask of the keys that have an embedding."""
+        return self._positions(np.asarray(keys, dtype="S32"))[1]
+
+    def get(self, keys):
+        """
+        Embeddings of some keys, one row per key, read from the chunk files.
+        Raises:
+            KeyError: If a key has no embedding
+        """
+        positions, found = self._positions(np.asarray(keys, dtype="S32"))
+        if not found.all():
+            raise KeyError(f"{int((~found).sum())} texts are not in the embedding cache")
+        embeddings = np.empty((len(positions), self.dim or 0), dtype=np.float32)
+        chunks, rows = self._chunks[positions], self._rows[positions]
+        for chunk in np.unique(chunks):
+            in_chunk = np.flatnonzero(chunks == chunk)
+            embeddings[in_chunk] = self._embeddings[chunk][rows[in_chunk]]
+        return embeddings
+
+    def add(self, keys, embeddings):
+        """Commit a chunk of embeddings: written to its own files, then visible to lookups."""
+        keys = np.asarray(keys, dtype="S32")
+        if len(keys) == 0:
+            return
+        name = self._chunk_name(keys)
+        self._write_chunk(name, keys, np.asarray(embeddings, dtype=np.float32))
+        self._open_chunk(name)
+
+    def compact(self, keep_keys=None):
+        """
+        Rewrite the cache as a single chunk, without the embeddings stored twice and, if
+        `keep_keys` is given, without the keys that aren't in it (e.g. ingredient lists of
+        recipes that were edited or removed). Embeddings are copied through memory maps.
+        Args:
+            keep_keys (array, optional): Keys to keep, all by default
+        Returns:
+            int: Number of embeddings dropped
+        """
+        self._merge()
+        keep = np.ones(len(self._keys), dtype=bool)
+        if keep_keys is not None:
+            keep = np.isin(self._keys, np.asarray(keep_keys, dtype="S32"))
+        stored = sum(len(embeddings) for embeddings in self._embeddings)
+        if len(self._names) <= 1 and keep.all() and stored == len(self._keys):
+            return 0
+        keys, chunks, rows = self._keys[keep], self._chunks[keep], self._rows[keep]
+        name = self._chunk_name(keys)
+        old_names = list(self._names)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = os.path.join(self.cache_dir, f"tmp-{name}.embeddings.npy")
+        embeddings = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32,
+                                               shape=(len(keys), self.dim or 0))
+        for chunk in np.unique(chunks):
+            in_chunk = np.flatnonzero(chunks == chunk)
+            embeddings[in_chunk] = self._embeddings[chunk][rows[in_chunk]]
+        embeddings.flush()
+        del embeddings
+        self._write_chunk(name, keys, embeddings_path=tmp_path)
+
+        # The compacted chunk is committed, so the old ones can go
+        self._keys, self._chunks, self._rows = self._keys[:0], self._chunks[:0], self._rows[:0]
+        self._embeddings, self._names, self._pending = [], [], []
+        for old_name in old_names:
+            for suffix in (".keys.npy", ".embeddings.npy"):
+                os.remove(os.path.join(self.cache_dir, old_name + suffix))
+        self._open_chunk(name)
+        return stored - len(keys)
+
+    @staticmethod
+    def _sequence(name):
+        """Commit sequence number of a chunk name (chunk-<sequence>-<hash>), -1 if it has none."""
+        parts = name.split("-")
+        return int(parts[1]) if len(parts) == 3 else -1
+
+    def _chunk_name(self, keys):
+        """Name of the next chunk to commit, numbered after every chunk already opened."""
+        return f"chunk-{self._next_sequence:08d}-{hashlib.sha256(keys.tobytes()).hexdigest()[:16]}"
+
+    def _write_chunk(self, name, keys, embeddings=None, embeddings_path=None):
+        """Write a chunk's embeddings (an array, or a finished temporary file) and then its keys."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, name)
+        if embeddings_path is None:
+            embeddings_path = os.path.join(self.cache_dir, f"tmp-{name}.embeddings.npy")
+            np.save(embeddings_path, embeddings)
+        os.replace(embeddings_path, path + ".embeddings.npy")
+        # The keys file commits the chunk: a crash before it leaves no chunk-*.keys.npy file
+        np.save(os.path.join(self.cache_dir, f"tmp-{name}.keys.npy"), keys)
+        os.replace(os.path.join(self.cache_dir, f"tmp-{name}.keys.npy"), path + ".keys.npy")
+
+    def _open_chunk(self, name):
+        if name in self._names:
+            return
+        path = os.path.join(self.cache_dir, name)
+        keys = np.load(path + ".keys.npy")
+        embeddings = np.load(path + ".embeddings.npy", mmap_mode="r")
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embeddings of size {embeddings.shape[1]} in a cache of size {self.dim}")
+        self._next_sequence = max(self._next_sequence, self._sequence(name) + 1)
+        self._names.append(name)
+        self._embeddings.append(embeddings)
+        self._pending.append((keys, len(self._embeddings) - 1))
+
+    def _merge(self):
+        if not self._pending:
+            return
+        all_keys = np.concatenate([self._keys] + [keys for keys, _ in self._pending])
+        all_chunks = np.concatenate([self._chunks] + [np.full(len(keys), chunk, dtype=np.int32)
+                                                      for keys, chunk in self._pending])
+        all_rows = np.concatenate([self._rows] + [np.arange(len(keys)) for keys, _ in self._pending])
+        # Keep the first committed embedding of a key stored twice (e.g. by two interrupted runs):
+        # np.unique returns the first occurrence, and chunks are pending in commit order
+        self._keys, first = np.unique(all_keys, return_index=True)
+        self._chunks, self._rows = all_chunks[first], all_rows[first]
+        self._pending = []
@@ -0,0 +1,40 @@
+import argparse
+import time
+import numpy as np
+from recipes_recommend import read_recipes, load_model, format_r_list
+from recipes_embedding_cache import EmbeddingCache
+from recipes_train_model import encode_chunks, start_encoder_pool
+
+# Encoding throughput of recipes_train_model.py for a few --workers values, on distinct
+# ingredient lists of the preprocessed recipes (what a cold cache encodes). Each worker
+# count runs the same texts through encode_chunks after a warm-up batch, so pool start-up
+# and the first forward pass are not counted.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark recipe encoding with 1 to N encoder processes.")
+    parser.add_argument("--rows", type=int, default=20_000, help="Distinct ingredient lists encoded per run")
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated worker counts to time")
+    parser.add_argument("--batch-size", type=int, default=256, help="Recipes per forward pass")
+    args = parser.parse_args()
+
+    parts = read_recipes(columns=["RecipeIngredientParts"])["RecipeIngredientParts"]
+    texts = np.unique([EmbeddingCache.normalize(format_r_list(value)) for value in parts])
+    texts = np.random.default_rng(0).permutation(texts)[:args.rows].tolist()
+    print(f"{len(texts)} distinct ingredient lists, batch size {args.batch_size}")
+
+    st_model = load_model()
+    print(f"{'workers':>8} {'recipes/s':>10} {'speedup':>8}")
+    rates = {}
+    for workers in [int(value) for value in args.workers.split(",")]:
+        pool = start_encoder_pool(st_model, workers)
+        try:
+            list(encode_chunks(st_model, texts[:args.batch_size * max(workers, 1)], pool, len(texts), args.batch_size))
+            start = time.perf_counter()
+            list(encode_chunks(st_model, texts, pool, len(texts), args.batch_size))
+            rates[workers] = len(texts) / (time.perf_counter() - start)
+        finally:
+            if pool is not None:
+                st_model.stop_multi_process_pool(pool)
+        print(f"{workers:>8} {rates[workers]:>10.0f} {rates[workers] / next(iter(rates.values())):>7.2f}x")
+
+    best = max(rates, key=rates.get)
+    print(f"✅ Fastest: {best} worker(s), {rates[best]:.0f} recipes/s.")
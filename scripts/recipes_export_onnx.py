@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import torch
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from recipes_recommend import load_data, load_model, OnnxEncoder, format_r_list, RECIPES_ONNX_PATH
+from recipes_embedding_cache import EmbeddingCache
+
+# Export the recipe model's transformer to ONNX, in float32 and dynamically quantized to int8,
+# for the "onnx" / "onnx-int8" encoders of RecipeRecommender. Then check that the ONNX
+# embeddings agree with the torch ones stored for the corpus, and compare the query latency
+# of the three backends at a few thread counts.
+parser = argparse.ArgumentParser(description="Export the recipe encoder to ONNX and report parity and latency.")
+parser.add_argument("--parity-rows", type=int, default=10_000, help="Recipes re-embedded for parity (0 for all)")
+parser.add_argument("--queries", type=int, default=200, help="Ingredient queries timed per backend")
+parser.add_argument("--threads", default="1,2,4", help="Comma separated thread counts to time")
+parser.add_argument("--candidates", type=int, default=50, help="Search results compared between backends")
+parser.add_argument("--min-cosine", type=float, default=0.99, help="Lowest acceptable mean cosine agreement")
+args = parser.parse_args()
+
+
+def export_onnx(st_model, config_path=RECIPES_ONNX_PATH):
+    """
+    Write the float32 and int8 ONNX models of a sentence transformer, its tokenizer and
+    encoder.json (written last, as the other files are complete) to the config's directory.
+    Raises:
+        ValueError: If the model isn't a transformer with mean pooling (and optional normalization)
+    """
+    modules = [type(module).__name__ for module in st_model]
+    if (modules[:2] != ["Transformer", "Pooling"] or st_model[1].get_pooling_mode_str() != "mean"
+            or any(module != "Normalize" for module in modules[2:])):
+        raise ValueError(f"Only transformer + mean pooling models can be exported, not {' + '.join(modules)}")
+    model_dir = os.path.dirname(config_path)
+    os.makedirs(model_dir, exist_ok=True)
+
+    tokenizer = st_model.tokenizer
+    sample = tokenizer(["chicken garlic rice"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    fp32_file, int8_file = "model.onnx", "model-int8.onnx"
+    with torch.no_grad():
+        torch.onnx.export(st_model[0].auto_model.eval(), tuple(sample[name] for name in input_names),
+                          os.path.join(model_dir, fp32_file), input_names=input_names,
+                          output_names=["last_hidden_state"], opset_version=14,
+                          dynamic_axes={name: {0: "batch", 1: "sequence"}
+                                        for name in input_names + ["last_hidden_state"]})
+    # Weights stored as int8, activations quantized on the fly
+    quantize_dynamic(os.path.join(model_dir, fp32_file), os.path.join(model_dir, int8_file),
+                     weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(model_dir)
+
+    config = {"dim": st_model.get_sentence_embedding_dimension(), "max_seq_length": st_model.max_seq_length,
+              "normalize": "Normalize" in modules, "tokenizer": "tokenizer.json",
+              "pad_token": tokenizer.pad_token, "pad_token_id": tokenizer.pad_token_id,
+              "files": {"fp32": fp32_file, "int8": int8_file}}
+    with open(config_path + ".tmp", "w") as config_file:
+        json.dump(config, config_file, indent=2)
+    os.replace(config_path + ".tmp", config_path)
+
+
+def row_cosines(a, b):
+    """Cosine similarity of each row of `a` with the same row of `b`."""
+    return (a * b).sum(axis=1) / np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+
+
+st_model = load_model()
+start = time.perf_counter()
+export_onnx(st_model)
+print(f"✅ Exported the encoder to '{os.path.dirname(RECIPES_ONNX_PATH)}' in {time.perf_counter() - start:.1f} s")
+backends = {"onnx": OnnxEncoder(quantized=False), "onnx-int8": OnnxEncoder(quantized=True)}
+
+# Parity: the stored corpus embeddings come from the torch model, on the same texts
+df, embeddings, _ = load_data(with_model=False)
+rng = np.random.default_rng(0)
+rows = np.arange(len(df)) if args.parity_rows <= 0 else np.sort(rng.choice(len(df), min(args.parity_rows, len(df)),
+                                                                           replace=False))
+texts = [EmbeddingCache.normalize(format_r_list(parts)) for parts in df["RecipeIngredientParts"].iloc[rows]]
+reference = np.asarray(embeddings[rows])
+print(f"Parity over {len(rows)} recipes (cosine with the stored torch embeddings)")
+print(f"{'backend':>10} {'mean':>8} {'p1':>8} {'min':>8}")
+agreement = {}
+for name, encoder in backends.items():
+    cosines = row_cosines(encoder.encode(texts, batch_size=64), reference)
+    agreement[name] = cosines.mean()
+    print(f"{name:>10} {cosines.mean():>8.5f} {np.percentile(cosines, 1):>8.5f} {cosines.min():>8.5f}")
+
+# Latency of single queries, built like the recommender's from some recipe's ingredients
+query_rows = rng.choice(len(df), args.queries, replace=True)
+queries = [" ".join(sorted({part for part in parts if part})) for parts in df["RecipeIngredientParts"].iloc[query_rows]]
+norms = np.maximum(np.linalg.norm(embeddings, axis=1), 1e-12)
+k = min(args.candidates, len(df) - 1)
+torch_results = []
+print(f"{'backend':>10} {'threads':>8} {'ms/query':>10} {'speedup':>8} {'top-' + str(k):>8}")
+for threads in [int(value) for value in args.threads.split(",")]:
+    torch.set_num_threads(threads)
+    timings = {}
+    for name, encoder in [("torch", st_model)] + [(name, OnnxEncoder(quantized=name == "onnx-int8", threads=threads))
+                                                  for name in backends]:
+        query_embeddings, seconds = [], []
+        for query in queries:
+            start = time.perf_counter()
+            query_embeddings.append(encoder.encode(query, convert_to_numpy=True))
+            seconds.append(time.perf_counter() - start)
+        timings[name] = np.median(seconds) * 1000
+        # Overlap of the exact top candidates with those of the torch query embeddings
+        results = [set(np.argpartition(-(embeddings @ embedding) / norms, k)[:k].tolist())
+                   for embedding in query_embeddings]
+        if name == "torch" and not torch_results:
+            torch_results = results
+        overlap = np.mean([len(a & b) / k for a, b in zip(results, torch_results)])
+        print(f"{name:>10} {threads:>8} {timings[name]:>10.2f} {timings['torch'] / timings[name]:>7.1f}x "
+              f"{overlap:>8.3f}")
+
+if min(agreement.values()) < args.min_cosine:
+    print(f"⚠️ Mean cosine agreement below {args.min_cosine}: {agreement}")
+    sys.exit(1)
+print(f"✅ ONNX encoders agree with torch (mean cosine >= {args.min_cosine}).")
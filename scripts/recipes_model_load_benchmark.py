@@ -0,0 +1,73 @@
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import numpy as np
+from recipes_recommend import load_model, RECIPES_MODEL_DIR, LEGACY_MODEL_PATH
+
+# Startup cost of the recipe model: unpickling a whole SentenceTransformer (the old format)
+# against load_model, which memory-maps the safetensors weights. Every load runs in a fresh
+# interpreter that has already imported sentence_transformers, so only the load is timed.
+# Memory is the private (unshared) resident memory the load adds, which is what every
+# extra API worker pays: mapped weight pages are shared between processes, copies are not.
+parser = argparse.ArgumentParser(description="Compare pickle and safetensors (mmap) model loading.")
+parser.add_argument("--runs", type=int, default=5, help="Fresh processes per format, the median is reported")
+args = parser.parse_args()
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+MEASURE = """
+import json, time
+import sentence_transformers
+{setup}
+
+def private_mb():
+    # Private resident memory of this process (Linux only)
+    try:
+        with open("/proc/self/smaps_rollup") as smaps:
+            return sum(int(line.split()[1]) for line in smaps
+                       if line.startswith(("Private_Clean", "Private_Dirty"))) / 1024
+    except OSError:
+        return float("nan")
+
+before = private_mb()
+start = time.perf_counter()
+{load}
+seconds = time.perf_counter() - start
+model.encode("warm up")
+print(json.dumps({{"seconds": seconds, "private_mb": private_mb() - before}}))
+"""
+# (imports, timed load) of each format
+LOADS = {
+    "pickle": ("import pickle", "with open({path!r}, 'rb') as model_file:\n    model = pickle.load(model_file)"),
+    "safetensors (mmap)": ("from recipes_recommend import load_model", "model = load_model({path!r})"),
+}
+
+
+def measure(setup, load):
+    """Load time (s) and added private memory (MB) of one load in a fresh interpreter."""
+    result = subprocess.run([sys.executable, "-c", MEASURE.format(setup=setup, load=load)], cwd=SCRIPTS_DIR,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# The pickled model, written from the current one if no legacy pickle is around
+with tempfile.TemporaryDirectory() as tmp_dir:
+    pickle_path = os.path.abspath(LEGACY_MODEL_PATH)
+    if not os.path.exists(pickle_path):
+        pickle_path = os.path.join(tmp_dir, "recipes_st.pkl")
+        with open(pickle_path, "wb") as model_file:
+            pickle.dump(load_model(), model_file)
+    paths = {"pickle": pickle_path, "safetensors (mmap)": os.path.abspath(RECIPES_MODEL_DIR)}
+
+    print(f"{'format':>20} {'load s':>8} {'private MB':>11}")
+    medians = {}
+    for name, (setup, load) in LOADS.items():
+        runs = [measure(setup, load.format(path=paths[name])) for _ in range(args.runs)]
+        medians[name] = np.median([run["seconds"] for run in runs])
+        print(f"{name:>20} {medians[name]:>8.3f} {np.median([run['private_mb'] for run in runs]):>11.1f}")
+
+print(f"✅ safetensors (mmap) / pickle load speedup: {medians['pickle'] / medians['safetensors (mmap)']:.1f}x "
+      f"(median of {args.runs} fresh processes).")
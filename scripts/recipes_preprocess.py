@@ -1,18 +1,24 @@
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import re
+import time
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from recipes_recommend import (RecipeFilters, parse_r_list, RECIPE_FILTERS_PATH, RECIPES_DATA_PATH,
+                               RECIPE_LIST_COLUMNS)
 
-# Load dataset
-df = pd.read_csv("data/recipes.csv")
-df =df.iloc[0:20000]
-#df =df.iloc[0:3000] # For testing purposes
+RAW_RECIPES_PATH = "data/recipes.csv"
+PREPROCESSED_RECIPES_PATH = RECIPES_DATA_PATH
 
 # convert columns in mg to g
 in_mg = ['CholesterolContent', 'SodiumContent']
 
 in_grams = ['ProteinContent', 'FatContent', 'CarbohydrateContent', 'saturatedFatContent', 'FiberContent', 'SugarContent']
 
-# Convert units (grams to milligrams, micrograms to milligrams)
-df[in_mg] = df[in_mg] / 1000
-
 # Define non-vegetarian keywords
 non_veg_keywords = set([
     # Meat & Poultry
@@ -40,6 +46,9 @@ non_veg_keywords = set([
     "liver", "kidney", "heart", "brain", "tripe", "sweetbreads", "tongue", "gizzards"
 ])
 
+# Every keyword in one alternation, matched anywhere in a recipe's text
+non_veg_pattern = "|".join(re.escape(keyword) for keyword in sorted(non_veg_keywords))
+
 # Function to classify recipes
 def classify_recipe(row):
     """
@@ -47,17 +56,14 @@ def classify_recipe(row):
     - `RecipeIngredientParts`
     - `RecipeCategory`
     """
-    # Extract ingredient list
-    ingredients = str(row["RecipeIngredientParts"]).lower().replace('"', '').replace("c(", "").replace(")", "")
-    ingredient_list = [ing.strip() for ing in ingredients.split(",")]
+    # Ingredient list (already parsed)
+    ingredient_list = [str(ing).lower() for ing in row["RecipeIngredientParts"] if ing is not None]
 
-    # Extract category list
-    categories = str(row["RecipeCategory"]).lower().replace('"', '').replace("c(", "").replace(")", "")
-    category_list = [cat.strip() for cat in categories.split(",")]
+    # Category (a single value)
+    category_list = [str(row["RecipeCategory"]).lower()]
 
-    # Extract and clean keywords list
-    keywords = str(row["Keywords"]).lower().replace('"', '').replace("c(", "").replace(")", "")
-    keyword_list = [kw.strip() for kw in keywords.split(",")]
+    # Keywords list (already parsed)
+    keyword_list = [str(kw).lower() for kw in row["Keywords"] if kw is not None]
 
     # Extract recipe name
     recipe_name = str(row["Name"]).lower()
@@ -71,24 +77,166 @@ def classify_recipe(row):
 
     return "Veg"
 
+
+def _item_lines(column):
+    """Items of a list column as one lowercased line each (missing items dropped)."""
+    return column.map(lambda items: "\n".join(filter(None, items))).str.lower()
+
+
+def classify_recipes(df):
+    """
+    Classify many recipes at once, with the same labels as `classify_recipe`.
+
+    classify_recipe tests every keyword against every item of every row in Python. Here
+    the items are joined into one text per recipe, one item per line, lowercased with
+    vectorized string operations, and the compiled keyword alternation scans each text
+    once. No keyword contains a newline, so a keyword is found in the text exactly when
+    classify_recipe finds it in one of the items. Missing values become "" rather than
+    "nan", which holds no keyword either.
+    Args:
+        df (DataFrame): Recipes with RecipeIngredientParts and Keywords lists, RecipeCategory and Name
+    Returns:
+        ndarray: "Non-Veg" or "Veg" per recipe
+    """
+    text = (_item_lines(df["RecipeIngredientParts"]) + "\n" + df["RecipeCategory"].fillna("").astype(str).str.lower()
+            + "\n" + _item_lines(df["Keywords"]) + "\n" + df["Name"].fillna("").astype(str).str.lower())
+    return np.where(text.str.contains(non_veg_pattern, regex=True).to_numpy(dtype=bool), "Non-Veg", "Veg")
+
+
 # checking if all the columns have 0 as value
 nutrient_columns = ["Calories", "FatContent", "SaturatedFatContent", "CholesterolContent", 
                         "SodiumContent", "CarbohydrateContent", "FiberContent", "SugarContent", "ProteinContent"]
 
-# separate rows where all nutrient values are 0
-# This will create a DataFrame with only those rows
-zero_nutrient_rows = df[nutrient_columns][(df[nutrient_columns] == 0).all(axis=1)]
-# print(zero_nutrient_rows)
+# Column types of the preprocessed recipes; lists are RECIPE_LIST_COLUMNS and every other column is text
+integer_columns = ["RecipeId", "AuthorId"]
+float_columns = nutrient_columns + ["AggregatedRating", "ReviewCount", "RecipeServings"]
+
 
-# print total number of rows where all nutrient values are 0
-# zero_nutrient_row_count = (df[nutrient_columns] == 0).all(axis=1).sum()
-# print(zero_nutrient_row_count)
+def recipe_schema(columns):
+    """Arrow schema of the preprocessed recipes, fixed up front so every chunk is written with the same types."""
+    def column_type(column):
+        if column in RECIPE_LIST_COLUMNS:
+            return pa.list_(pa.string())
+        if column in integer_columns:
+            return pa.int64()
+        if column in float_columns:
+            return pa.float64()
+        return pa.string()
+    return pa.schema([(column, column_type(column)) for column in columns])
 
-# Remove rows where all nutrient values are 0
-df = df[~(df[nutrient_columns] == 0).all(axis=1)]
 
-# Apply classification
-df["DietaryCategory"] = df.apply(classify_recipe, axis=1)
+def preprocess_chunk(df):
+    """
+    Preprocess raw recipe rows. Every step only looks at its own row, so any split
+    of the raw file into chunks gives the same rows as preprocessing it at once.
+    Args:
+        df (DataFrame): Raw recipe rows (laid out like data/recipes.csv)
+    Returns:
+        DataFrame: Rows with some nutrient, units converted, lists parsed and a DietaryCategory
+    """
+    # Convert units (milligrams to grams)
+    df[in_mg] = df[in_mg] / 1000
+
+    # Remove rows where all nutrient values are 0
+    df = df[~(df[nutrient_columns] == 0).all(axis=1)].copy()
 
-# Save processed data
-df.to_csv("data/preprocessed/recipes.csv", index=False)
+    # Parse the R list text once, downstream code reads real lists
+    for column in RECIPE_LIST_COLUMNS:
+        df[column] = df[column].map(parse_r_list)
+
+    # Apply classification
+    df["DietaryCategory"] = classify_recipes(df)
+    return df
+
+
+def _preprocess_to_table(chunk, schema):
+    """
+    What a pool worker runs: `preprocess_chunk`, with the rows already converted to an
+    Arrow table, so the parent process only has to write them.
+    Returns:
+        tuple: (raw rows, Arrow table)
+    """
+    df = preprocess_chunk(chunk)
+    arrays = [pa.array(df[field.name], type=field.type, from_pandas=True) for field in schema]
+    return len(chunk), pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _preprocessed_chunks(chunks, schema, workers):
+    """
+    Preprocess chunks on `workers` processes, yielding `_preprocess_to_table` results in input order.
+
+    At most two chunks per worker are in flight, so memory stays bounded, and results
+    are yielded in the order the chunks were read, so the output is the same as serially.
+    """
+    if workers <= 1:
+        yield from (_preprocess_to_table(chunk, schema) for chunk in chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(_preprocess_to_table, chunk, schema))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def preprocess_recipes(input_path=RAW_RECIPES_PATH, output_path=PREPROCESSED_RECIPES_PATH, chunk_size=100_000,
+                       workers=1):
+    """
+    Stream the raw recipes through `preprocess_chunk`, `chunk_size` rows at a time.
+
+    Each chunk is appended to the output (a Parquet row group) as soon as it is processed,
+    so memory stays bounded by the chunk size whatever the size of the input. The output is written
+    under a temporary name and only replaces the previous one once complete. With
+    several workers, the chunks (consecutive row ranges) are processed by a process
+    pool and written back in input order.
+    Args:
+        input_path (str): Raw recipes CSV
+        output_path (str): Preprocessed recipes Parquet file
+        chunk_size (int): Raw rows read at a time
+        workers (int): Preprocessing processes (1 preprocesses in this process)
+    Returns:
+        tuple: (raw rows read, rows written)
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    columns = pd.read_csv(input_path, nrows=0).columns.tolist()
+    schema = recipe_schema(columns + ["DietaryCategory"])
+    # Text columns are read as text even when a chunk happens to hold only numbers or nothing
+    text_columns = {field.name: str for field in schema
+                    if field.name in columns and field.name not in integer_columns + float_columns}
+    chunks = pd.read_csv(input_path, chunksize=chunk_size, dtype=text_columns)
+    rows_read = rows_written = 0
+    start = time.perf_counter()
+    with pq.ParquetWriter(tmp_path, schema) as output:
+        for raw_rows, table in _preprocessed_chunks(chunks, schema, workers):
+            rows_read += raw_rows
+            output.write_table(table)
+            rows_written += table.num_rows
+            elapsed = time.perf_counter() - start
+            print(f"Preprocessed {rows_read} recipes ({rows_read / elapsed:.0f} rows/s)")
+    os.replace(tmp_path, output_path)
+    return rows_read, rows_written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the raw recipes and classify their diet.")
+    parser.add_argument("--input", default=RAW_RECIPES_PATH)
+    parser.add_argument("--output", default=PREPROCESSED_RECIPES_PATH)
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="Raw rows per chunk")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Preprocessing processes (1 preprocesses in this process)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows_read, rows_written = preprocess_recipes(args.input, args.output, args.chunk_size, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"✅ {rows_written} of {rows_read} recipes saved as '{args.output}' in {elapsed:.1f} s "
+          f"({rows_read / elapsed:.0f} rows/s, {args.workers} worker(s)).")
+
+    # Bitsets and sorted columns for filtering by diet, category, time and rating at query time,
+    # built from the few columns they need so memory stays bounded
+    filter_columns = ["RecipeId"] + RecipeFilters.CATEGORICAL_COLUMNS + RecipeFilters.RANGE_COLUMNS
+    RecipeFilters.from_frame(pd.read_parquet(args.output, columns=filter_columns)).save(RECIPE_FILTERS_PATH)
+    print(f"✅ Recipe filter index saved as '{RECIPE_FILTERS_PATH}'.")
@@ -1,148 +1,775 @@
+import os
+import glob
+import json
+import re
+import threading
+from functools import lru_cache
 import numpy as np
 import pandas as pd
-import torch
-from sentence_transformers import SentenceTransformer, util
-from sklearn.metrics.pairwise import cosine_similarity
 import pickle
+try:
+    from .food_recommend import file_hash  # imported as scripts.recipes_recommend (API, Streamlit pages)
+except ImportError:
+    from food_recommend import file_hash  # run from scripts/
 
-# Set device (CPU or GPU)
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# torch and sentence_transformers are only imported when the model is loaded, and
+# onnxruntime only by OnnxEncoder, so importing this module (the API, the Streamlit page)
+# stays fast.
 
-import torch
+# Artifacts produced by recipes_preprocess.py and recipes_train_model.py
+RECIPES_DATA_PATH = "data/preprocessed/recipes.parquet"
+RECIPE_EMBEDDINGS_PATH = "data/embeddings/recipes/manifest.json"
+RECIPE_EMBEDDINGS_VERSION = 1
+# Sentence transformer directory (SentenceTransformer.save layout, safetensors weights)
+RECIPES_MODEL_DIR = "models/recipes_st"
+# ONNX export of the model's transformer, written by recipes_export_onnx.py
+RECIPES_ONNX_PATH = "models/recipes_onnx/encoder.json"
+RECIPE_FILTERS_PATH = "data/preprocessed/recipes_filters.npz"
+# Embeddings as stringified lists in a CSV, written by older versions of recipes_train_model.py
+LEGACY_EMBEDDINGS_PATH = "data/embeddings/recipes.csv"
+# Pickled SentenceTransformer, written by older versions of recipes_train_model.py
+LEGACY_MODEL_PATH = "models/recipes_st.pkl"
 
-@torch.jit.script
-class MyCustomClass:
-    def __init__(self):
-        pass
+# Columns holding lists of strings, which Food.com exports as R vectors such as c("a", "b")
+RECIPE_LIST_COLUMNS = ["Images", "Keywords", "RecipeIngredientQuantities", "RecipeIngredientParts",
+                       "RecipeInstructions"]
+# A double-quoted R string (with backslash escapes) or a missing value
+R_LIST_ITEM = re.compile(r'"((?:[^"\\]|\\.)*)"|\bNA\b')
+R_ESCAPES = {"n": "\n", "t": "\t"}
 
-# Load model
-def load_data():
-    """ Load dataset with embeddings """
-    df = pd.read_csv("data/embeddings/recipes.csv")
-    
-    # Ensure embeddings are properly converted to tensors and moved to the correct device
-    df["IngredientEmbedding"] = df["IngredientEmbedding"].apply(lambda x: torch.tensor(eval(x)).to(device))
+# DietaryCategory values each diet preference may be recommended. Each diet gets its own ANN
+# index; any other preference (e.g. Non-veg) searches all recipes.
+DIET_CATEGORIES = {
+    "Veg": ["Veg"],
+}
 
-    with open("models/recipes_st.pkl", "rb") as model_file:
-        model_st = pickle.load(model_file)
 
-    return df, model_st
+def _write_manifest(manifest, manifest_path):
+    """Replace a store manifest atomically, then drop the files it no longer references."""
+    with open(manifest_path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    # Processes still mapping old files keep their pages until they reload
+    referenced = {manifest["embeddings"], manifest["recipe_ids"], *manifest.get("ann", {}).get("indexes", {}).values(),
+                  *manifest.get("foods", {}).values()}
+    store_dir = os.path.dirname(manifest_path)
+    for old_file in glob.glob(os.path.join(store_dir, "*.npy")) + glob.glob(os.path.join(store_dir, "ann-*.bin")):
+        if os.path.basename(old_file) not in referenced:
+            os.remove(old_file)
+
+
+def save_recipe_embeddings(embeddings, recipe_ids, model_name, store_dir=os.path.dirname(RECIPE_EMBEDDINGS_PATH)):
+    """
+    Write the recipe embedding store from an in-memory matrix (see `stream_recipe_embeddings`).
+    Args:
+        embeddings (ndarray): One ingredient embedding per recipe
+        recipe_ids (array-like): RecipeId of each row
+        model_name (str): Sentence transformer the embeddings come from (None if unknown)
+        store_dir (str): Directory of the store
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return stream_recipe_embeddings([embeddings], recipe_ids, embeddings.shape[1], model_name, store_dir)
+
+
+def stream_recipe_embeddings(blocks, recipe_ids, dim, model_name, store_dir=os.path.dirname(RECIPE_EMBEDDINGS_PATH)):
+    """
+    Write the recipe embedding store: a float32 matrix, the RecipeId of each row and a manifest.
+
+    Blocks of rows are written to a memory-mapped file as they arrive, so the whole matrix
+    never has to be held in memory. File names carry their content hash and the manifest
+    is swapped in last, so a process still mapping the previous matrix is never affected.
+    Args:
+        blocks (iterable): Consecutive blocks of embeddings, in recipe_ids order
+        recipe_ids (array-like): RecipeId of each row
+        dim (int): Embedding size
+        model_name (str): Sentence transformer the embeddings come from (None if unknown)
+        store_dir (str): Directory of the store
+    Returns:
+        ndarray: The stored matrix, memory-mapped read-only
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    recipe_ids = np.ascontiguousarray(recipe_ids, dtype=np.int64)
+
+    tmp_paths = {"embeddings": os.path.join(store_dir, "embeddings.tmp.npy"),
+                 "recipe_ids": os.path.join(store_dir, "recipe_ids.tmp.npy")}
+    matrix = np.lib.format.open_memmap(tmp_paths["embeddings"], mode="w+", dtype=np.float32,
+                                       shape=(len(recipe_ids), dim))
+    position = 0
+    for block in blocks:
+        if position + len(block) > len(recipe_ids):
+            raise ValueError(f"More embeddings than the {len(recipe_ids)} recipe ids")
+        matrix[position:position + len(block)] = block
+        position += len(block)
+    matrix.flush()
+    del matrix
+    if position != len(recipe_ids):
+        raise ValueError(f"{position} embeddings but {len(recipe_ids)} recipe ids")
+    np.save(tmp_paths["recipe_ids"], recipe_ids)
+
+    files = {}
+    for name, tmp_path in tmp_paths.items():
+        files[name] = f"{name}-{file_hash(tmp_path)[:16]}.npy"
+        os.replace(tmp_path, os.path.join(store_dir, files[name]))
+
+    manifest = {
+        "format_version": RECIPE_EMBEDDINGS_VERSION,
+        "model": model_name,
+        "dtype": "float32",
+        "shape": [len(recipe_ids), dim],
+        **files,
+    }
+    # New embeddings invalidate the ANN indexes, save_recipe_ann adds fresh ones
+    _write_manifest(manifest, os.path.join(store_dir, os.path.basename(RECIPE_EMBEDDINGS_PATH)))
+    return np.load(os.path.join(store_dir, files["embeddings"]), mmap_mode='r')
+
+
+def load_recipe_embeddings(manifest_path=RECIPE_EMBEDDINGS_PATH):
+    """
+    Open the recipe embedding store.
+    Returns:
+        tuple: (read-only memory-mapped float32 matrix, RecipeId of each row, manifest)
+    """
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get("format_version") != RECIPE_EMBEDDINGS_VERSION:
+        raise ValueError(f"Recipe embeddings '{manifest_path}' have format version {manifest.get('format_version')}, "
+                         f"expected {RECIPE_EMBEDDINGS_VERSION}. Re-run recipes_train_model.py.")
+    store_dir = os.path.dirname(manifest_path)
+    embeddings = np.load(os.path.join(store_dir, manifest["embeddings"]), mmap_mode='r')
+    recipe_ids = np.load(os.path.join(store_dir, manifest["recipe_ids"]))
+    return embeddings, recipe_ids, manifest
+
+
+def build_ann_index(embeddings, rows, M=16, ef_construction=200, num_threads=-1, chunk_size=100_000):
+    """
+    Build an HNSW index (hnswlib, cosine space) over some rows of the embedding matrix.
+
+    Labels are the row numbers in the store, so results index the embeddings and the
+    recipes directly. Rows are added in chunks to bound memory on a mapped matrix.
+    Args:
+        embeddings (ndarray): Embedding matrix (may be memory-mapped)
+        rows (ndarray): Rows to index
+        M (int): Links per node; more gives better recall for more memory
+        ef_construction (int): Build-time beam width; more gives a better graph, built slower
+        num_threads (int): Build threads, -1 for all cores
+    Returns:
+        hnswlib.Index
+    """
+    import hnswlib  # optional dependency, only needed for the ANN index
+
+    rows = np.asarray(rows, dtype=np.int64)
+    index = hnswlib.Index(space="cosine", dim=embeddings.shape[1])
+    index.init_index(max_elements=max(len(rows), 1), ef_construction=ef_construction, M=M)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        index.add_items(np.asarray(embeddings[chunk], dtype=np.float32), chunk, num_threads=num_threads)
+    return index
+
+
+def save_recipe_ann(indexes, params, manifest_path=RECIPE_EMBEDDINGS_PATH):
+    """
+    Store ANN indexes next to the embeddings and list them in the manifest.
+    Args:
+        indexes (dict): Diet (or "all" for every recipe) -> hnswlib.Index
+        params (dict): Build parameters, recorded in the manifest
+    """
+    store_dir = os.path.dirname(manifest_path)
+    files = {}
+    for key, index in indexes.items():
+        tmp_path = os.path.join(store_dir, f"ann-{key}.tmp")
+        index.save_index(tmp_path)
+        files[key] = f"ann-{key}-{file_hash(tmp_path)[:16]}.bin"
+        os.replace(tmp_path, os.path.join(store_dir, files[key]))
+
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    manifest["ann"] = {"library": "hnswlib", "space": "cosine", **params, "indexes": files}
+    _write_manifest(manifest, manifest_path)
+
+
+def load_ann_indexes(manifest_path=RECIPE_EMBEDDINGS_PATH, ef_search=128):
+    """
+    Load the ANN indexes listed in the store manifest.
+    Args:
+        ef_search (int): Query-time beam width; more gives better recall, slower queries
+    Returns:
+        dict: Diet (or "all") -> hnswlib.Index; empty without indexes or without hnswlib
+    """
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    ann = manifest.get("ann")
+    if not ann:
+        return {}
+    try:
+        import hnswlib
+    except ImportError:
+        print("⚠️ hnswlib is not installed, recipe search falls back to exact search.")
+        return {}
+
+    indexes = {}
+    for key, file_name in ann["indexes"].items():
+        index = hnswlib.Index(space=ann["space"], dim=manifest["shape"][1])
+        index.load_index(os.path.join(os.path.dirname(manifest_path), file_name))
+        index.set_ef(ef_search)
+        indexes[key] = index
+    return indexes
+
+
+def save_food_embeddings(names, embeddings, manifest_path=RECIPE_EMBEDDINGS_PATH):
+    """
+    Store embeddings of the food catalog descriptions next to the recipe embeddings.
+
+    With them a query made of catalog foods can be embedded without running the model
+    (see `RecipeRecommender`).
+    Args:
+        names (list): Food descriptions, as the food recommendations show them
+        embeddings (ndarray): One embedding per name, from the same model as the recipes
+    """
+    store_dir = os.path.dirname(manifest_path)
+    files = {}
+    arrays = {"names": np.asarray(names, dtype=str), "embeddings": np.asarray(embeddings, dtype=np.float32)}
+    for name, array in arrays.items():
+        tmp_path = os.path.join(store_dir, f"foods_{name}.tmp.npy")
+        np.save(tmp_path, array)
+        files[name] = f"foods_{name}-{file_hash(tmp_path)[:16]}.npy"
+        os.replace(tmp_path, os.path.join(store_dir, files[name]))
+
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    manifest["foods"] = files
+    _write_manifest(manifest, manifest_path)
+
+
+def load_food_embeddings(manifest_path=RECIPE_EMBEDDINGS_PATH):
+    """
+    Load the food description embeddings listed in the store manifest.
+    Returns:
+        tuple: (food name -> row, embedding matrix), or None if the store has none
+    """
+    with open(manifest_path) as manifest_file:
+        foods = json.load(manifest_file).get("foods")
+    if not foods:
+        return None
+    store_dir = os.path.dirname(manifest_path)
+    names = np.load(os.path.join(store_dir, foods["names"]))
+    embeddings = np.load(os.path.join(store_dir, foods["embeddings"]))
+    return {name: row for row, name in enumerate(names.tolist())}, embeddings
+
+
+def iso_duration_minutes(durations):
+    """
+    Minutes of ISO-8601 durations such as "PT1H30M".
+
+    Food.com leaves CookTime empty for recipes without cooking, so missing or
+    unparseable durations count as 0 minutes.
+    """
+    parts = pd.Series(durations, dtype="object").astype("string").str.extract(
+        r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+    parts = parts.astype(float).fillna(0).to_numpy()
+    return (parts[:, 0] * 1440 + parts[:, 1] * 60 + parts[:, 2] + parts[:, 3] / 60).astype(np.float32)
+
+
+class RecipeFilters:
+    """
+    Filter index over recipe metadata, built once by recipes_preprocess.py.
+
+    Every value of a categorical column has a bitset of its recipes (np.packbits), and
+    every range column keeps its values sorted with the matching rows, so a bound is a
+    binary search. Conditions are combined by AND-ing bitsets, which for 500k recipes
+    is a few 64 kB arrays, and the result is used as row positions into the embedding
+    matrix, which is never copied.
+    """
+
+    CATEGORICAL_COLUMNS = ["DietaryCategory", "RecipeCategory"]
+    # Durations are stored in minutes
+    RANGE_COLUMNS = ["CookTime", "TotalTime", "AggregatedRating"]
+
+    def __init__(self, arrays):
+        """
+        Args:
+            arrays (dict): Arrays built by `from_frame` (or read back from its file)
+        """
+        self.arrays = arrays
+        self.recipe_ids = arrays["recipe_ids"]
+        self.size = len(self.recipe_ids)
+        self.values = {column: {value: i for i, value in enumerate(arrays[f"{column}_values"].tolist())}
+                       for column in self.CATEGORICAL_COLUMNS}
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build the index for the recipes of a DataFrame, in row order."""
+        arrays = {"recipe_ids": df["RecipeId"].to_numpy(dtype=np.int64)}
+        for column in cls.CATEGORICAL_COLUMNS:
+            codes, values = pd.factorize(df[column].astype("string").fillna(""), sort=True)
+            arrays[f"{column}_values"] = np.asarray(values, dtype=str)
+            arrays[f"{column}_bits"] = np.packbits(codes[None, :] == np.arange(len(values))[:, None],
+                                                   axis=1, bitorder="little")
+        for column in cls.RANGE_COLUMNS:
+            if column == "AggregatedRating":
+                values = df[column].to_numpy(dtype=np.float32)  # unrated recipes never pass a rating bound
+            else:
+                values = iso_duration_minutes(df[column])
+            rows = np.flatnonzero(~np.isnan(values))
+            order = rows[np.argsort(values[rows], kind="stable")]
+            arrays[f"{column}_sorted"] = values[order]
+            arrays[f"{column}_order"] = order.astype(np.int32)
+        return cls(arrays)
+
+    @classmethod
+    def load(cls, path=RECIPE_FILTERS_PATH):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(dict(arrays))
+
+    def save(self, path=RECIPE_FILTERS_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path + ".tmp.npz", **self.arrays)
+        os.replace(path + ".tmp.npz", path)
+
+    def _category_bits(self, column, values):
+        """Bitset of the recipes whose column is any of some values."""
+        positions = [self.values[column][value] for value in values if value in self.values[column]]
+        if not positions:
+            return np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        return np.bitwise_or.reduce(self.arrays[f"{column}_bits"][positions], axis=0)
+
+    def _range_bits(self, column, low=None, high=None):
+        """Bitset of the recipes whose column lies in [low, high]."""
+        values = self.arrays[f"{column}_sorted"]
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        end = len(values) if high is None else np.searchsorted(values, high, side="right")
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.arrays[f"{column}_order"][start:end]] = True
+        return np.packbits(mask, bitorder="little")
+
+    def rows(self, diet_categories=None, recipe_categories=None, max_cook_minutes=None, max_total_minutes=None,
+             min_rating=None):
+        """
+        Rows of the recipes that pass every given condition.
+        Args:
+            diet_categories (list, optional): Allowed DietaryCategory values
+            recipe_categories (list, optional): Allowed RecipeCategory values
+            max_cook_minutes (float, optional): Longest CookTime
+            max_total_minutes (float, optional): Longest TotalTime
+            min_rating (float, optional): Lowest AggregatedRating
+        Returns:
+            ndarray: Sorted row positions, or None if no condition was given (every row passes)
+        """
+        bitsets = []
+        if diet_categories is not None:
+            bitsets.append(self._category_bits("DietaryCategory", diet_categories))
+        if recipe_categories is not None:
+            bitsets.append(self._category_bits("RecipeCategory", recipe_categories))
+        if max_cook_minutes is not None:
+            bitsets.append(self._range_bits("CookTime", high=max_cook_minutes))
+        if max_total_minutes is not None:
+            bitsets.append(self._range_bits("TotalTime", high=max_total_minutes))
+        if min_rating is not None:
+            bitsets.append(self._range_bits("AggregatedRating", low=min_rating))
+        if not bitsets:
+            return None
+        bits = np.bitwise_and.reduce(bitsets, axis=0) if len(bitsets) > 1 else bitsets[0]
+        return np.flatnonzero(np.unpackbits(bits, count=self.size, bitorder="little"))
+
+
+def load_recipe_filters(df, path=RECIPE_FILTERS_PATH):
+    """Filter index of the recipes in `df`, rebuilt in memory if the saved one is missing or for other recipes."""
+    if os.path.exists(path):
+        filters = RecipeFilters.load(path)
+        if np.array_equal(filters.recipe_ids, df["RecipeId"].to_numpy()):
+            return filters
+        print(f"⚠️ Recipe filter index '{path}' doesn't match the embedded recipes, rebuilding it in memory.")
+    return RecipeFilters.from_frame(df)
+
+
+def import_legacy_embeddings(csv_path=LEGACY_EMBEDDINGS_PATH, manifest_path=RECIPE_EMBEDDINGS_PATH):
+    """Convert an embeddings CSV (stringified lists, see LEGACY_EMBEDDINGS_PATH) into the binary store."""
+    legacy = pd.read_csv(csv_path, usecols=["RecipeId", "IngredientEmbedding"])
+    # Parse the "[0.1, -0.2, ...]" text as numbers, never as Python code
+    embeddings = np.stack([np.fromstring(text.strip("[]"), sep=",", dtype=np.float32)
+                           for text in legacy["IngredientEmbedding"]])
+    save_recipe_embeddings(embeddings, legacy["RecipeId"].to_numpy(), None, os.path.dirname(manifest_path))
+
+
+def parse_r_list(value):
+    """
+    Items of an R vector as exported by Food.com: 'c("a", "b")', '"a"' or 'character(0)'.
+    Missing items (NA) are None, and a missing vector is an empty list.
+    """
+    if not isinstance(value, str):
+        return []
+    return [None if item.group(1) is None
+            else re.sub(r"\\(.)", lambda escape: R_ESCAPES.get(escape.group(1), escape.group(1)), item.group(1))
+            for item in R_LIST_ITEM.finditer(value)]
+
+
+def format_r_list(items):
+    """
+    Inverse of `parse_r_list`, up to whitespace. Recipes are embedded from this text,
+    the form their ingredients had when the embedding model was chosen.
+    """
+    if items is None or len(items) == 0:
+        return "character(0)"
+    quoted = ["NA" if item is None else '"' + item.replace("\\", "\\\\").replace('"', '\\"') + '"' for item in items]
+    return quoted[0] if len(quoted) == 1 else "c(" + ", ".join(quoted) + ")"
+
+
+def read_recipes(path=RECIPES_DATA_PATH, columns=None):
+    """
+    Read the preprocessed recipes, with real lists in the RECIPE_LIST_COLUMNS.
+
+    A CSV written by older versions of recipes_preprocess.py next to the missing Parquet
+    file is parsed and converted once. Without a Parquet engine it is parsed on every read.
+    Args:
+        path (str): Preprocessed recipes (Parquet)
+        columns (list, optional): Columns to read, all by default
+    Returns:
+        DataFrame: Recipes; list cells are sequences of str (None for missing items)
+    """
+    if os.path.exists(path):
+        return pd.read_parquet(path, columns=columns)
+    csv_path = os.path.splitext(path)[0] + ".csv"
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"No preprocessed recipes at '{path}'. Run recipes_preprocess.py.")
+
+    df = pd.read_csv(csv_path)
+    for column in RECIPE_LIST_COLUMNS:
+        df[column] = df[column].map(parse_r_list)
+    try:
+        df.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        print(f"⚠️ Converted legacy recipes '{csv_path}' to '{path}'.")
+    except ImportError:
+        print("⚠️ No Parquet engine (pyarrow) installed, parsing the recipes CSV on every load.")
+    return df if columns is None else df[columns]
+
+
+def cosine_similarities(matrix, query):
+    """Cosine similarity of every matrix row with a query vector (zero vectors score 0)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    query = np.asarray(query, dtype=np.float32)
+    query = query / max(np.linalg.norm(query), 1e-12)
+    return (matrix @ query) / np.maximum(np.linalg.norm(matrix, axis=1), 1e-12)
+
+
+def load_model(model_dir=RECIPES_MODEL_DIR):
+    """
+    Load the sentence transformer (this imports torch and sentence_transformers).
+
+    The transformer's parameters are then re-pointed at a memory map of its
+    model.safetensors (load_state_dict with assign=True), so no process holds a private
+    copy of the weights: every API worker maps the same file pages from the OS page cache.
+    A model pickled by older versions of recipes_train_model.py is converted once.
+    Args:
+        model_dir (str): Directory written by SentenceTransformer.save
+    Returns:
+        SentenceTransformer: Model on the CPU
+    """
+    from safetensors.torch import load_file
+    from sentence_transformers import SentenceTransformer
+
+    if not os.path.exists(os.path.join(model_dir, "modules.json")) and os.path.exists(LEGACY_MODEL_PATH):
+        print(f"⚠️ Converting the pickled model '{LEGACY_MODEL_PATH}' to '{model_dir}'.")
+        with open(LEGACY_MODEL_PATH, "rb") as model_file:
+            pickle.load(model_file).save(model_dir, safe_serialization=True)
+
+    model_st = SentenceTransformer(model_dir, device="cpu")
+    # The transformer module's weights (at the top of the directory for a plain SentenceTransformer.save)
+    with open(os.path.join(model_dir, "modules.json")) as modules_file:
+        transformer_dir = next(module["path"] for module in json.load(modules_file)
+                               if module["type"].endswith("Transformer"))
+    weights = load_file(os.path.join(model_dir, transformer_dir, "model.safetensors"))
+    model_st[0].auto_model.load_state_dict(weights, assign=True)
+    return model_st
+
+
+class OnnxEncoder:
+    """
+    Sentence encoder running the ONNX export of the model (see recipes_export_onnx.py)
+    on onnxruntime, with the tokenizer and mean pooling of the sentence transformer it
+    was exported from. Needs neither torch nor sentence_transformers, and the dynamically
+    int8-quantized export trades a little accuracy for speed on CPU.
+    `encode` accepts the SentenceTransformer.encode arguments the recommender uses.
+    """
+
+    def __init__(self, config_path=RECIPES_ONNX_PATH, quantized=True, threads=None):
+        """
+        Args:
+            config_path (str): encoder.json written by recipes_export_onnx.py
+            quantized (bool): Run the int8 model instead of the float32 one
+            threads (int, optional): Threads per inference, onnxruntime's default (all cores) if None
+        """
+        import onnxruntime  # optional dependencies, only needed for this backend
+        from tokenizers import Tokenizer
+
+        with open(config_path) as config_file:
+            self.config = json.load(config_file)
+        model_dir = os.path.dirname(config_path)
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        model_path = os.path.join(model_dir, self.config["files"]["int8" if quantized else "fp32"])
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, self.config["tokenizer"]))
+        self.tokenizer.enable_truncation(self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dim"]
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, **kwargs):
+        """Embed a text (1-D result) or a list of texts (one row per text)."""
+        texts = [sentences] if isinstance(sentences, str) else list(sentences)
+        embeddings = np.empty((len(texts), self.config["dim"]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            inputs = {"input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                      "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+                      "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)}
+            hidden = self.session.run(["last_hidden_state"],
+                                      {name: value for name, value in inputs.items() if name in self.input_names})[0]
+            # Mean of the token embeddings, padding excluded (as sentence_transformers' mean pooling)
+            mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+            embeddings[start:start + len(encodings)] = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.config["normalize"]:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings[0] if isinstance(sentences, str) else embeddings
+
+
+def load_data(with_model=True):
+    """
+    Load the recipes, their ingredient embeddings and the sentence transformer.
+    Args:
+        with_model (bool): Also load the sentence transformer (None in its place otherwise)
+    Returns:
+        tuple: (recipes DataFrame, memory-mapped embedding matrix whose row i is recipe i of the DataFrame, model)
+    """
+    if not os.path.exists(RECIPE_EMBEDDINGS_PATH) and os.path.exists(LEGACY_EMBEDDINGS_PATH):
+        print(f"⚠️ Converting legacy embeddings '{LEGACY_EMBEDDINGS_PATH}' to '{os.path.dirname(RECIPE_EMBEDDINGS_PATH)}'.")
+        import_legacy_embeddings()
+    embeddings, recipe_ids, _ = load_recipe_embeddings()
+
+    # Align the recipes with the embedding rows by RecipeId
+    df = read_recipes()
+    rows = pd.Index(df["RecipeId"]).get_indexer(recipe_ids)
+    if (rows < 0).any():
+        raise ValueError(f"{int((rows < 0).sum())} embedded recipes are missing from '{RECIPES_DATA_PATH}'. "
+                         "Re-run recipes_train_model.py.")
+    df = df.iloc[rows].reset_index(drop=True)
+
+    return df, embeddings, load_model() if with_model else None
+
+# Nutrients the second ranking stage compares, and the columns a recommendation returns
+NUTRIENT_COLUMNS = ["Calories", "FatContent", "CarbohydrateContent", "FiberContent", "SugarContent", "ProteinContent"]
+RECIPE_COLUMNS = [
+    "Name", "CookTime", "Images", "RecipeCategory", "Keywords",
+    "RecipeIngredientQuantities", "RecipeIngredientParts",
+    "Calories", "FatContent", "SaturatedFatContent", "CholesterolContent",
+    "SodiumContent", "CarbohydrateContent", "FiberContent",
+    "SugarContent", "ProteinContent", "RecipeInstructions", "DietaryCategory"
+]
+
+
+class RecipeRecommender:
+    """
+    Process-resident recipe recommendation engine.
+
+    Loads the recipes, the memory-mapped embedding matrix and the sentence transformer
+    once and keeps them around, so a query only pays for encoding its ingredients and
+    scoring. Recipes are ranked in two steps: the `candidates` most similar by
+    ingredients, then re-ranked by a weighted sum of ingredient and nutrient cosine
+    similarity. Nutrients are compared after dividing every column by its corpus-wide
+    maximum, so a recipe's score doesn't depend on which other recipes are candidates.
+    Diet and metadata filters (see `RecipeFilters`) restrict the rows before scoring.
+    The ingredient step uses the ANN index of the diet when there is one and more than
+    `exact_max_rows` recipes pass the filters, and an exact scan otherwise.
+    Query embeddings are kept in an LRU cache keyed on the set of ingredients.
+    """
+
+    def __init__(self, candidates=50, ingredient_weight=0.5, nutrient_weight=0.5, ef_search=128,
+                 exact_max_rows=20_000, query_cache_size=1024, compose_queries=False, encoder="torch",
+                 encoder_threads=None):
+        """
+        Args:
+            candidates (int): Recipes kept by the ingredient step for nutrient re-ranking (at least k)
+            ingredient_weight (float): Weight of ingredient similarity in the final score
+            nutrient_weight (float): Weight of nutrient similarity in the final score
+            ef_search (int): ANN beam width, raise it for recall, lower it for latency (at least `candidates`)
+            exact_max_rows (int): Filtered sets of at most this many recipes are always searched exactly
+            query_cache_size (int): Ingredient sets whose embedding is kept
+            compose_queries (bool): Fast mode, embed queries made only of catalog foods as the mean
+                of their precomputed (normalized) embeddings instead of running the model.
+                An approximation of the model's embedding of the joined names.
+            encoder (str): Query encoder backend, "torch" (the sentence transformer), "onnx" (its
+                float32 ONNX export) or "onnx-int8" (the quantized export), see recipes_export_onnx.py
+            encoder_threads (int, optional): Threads of an ONNX encoder, all cores if None
+        """
+        if encoder not in ("torch", "onnx", "onnx-int8"):
+            raise ValueError(f"Unknown encoder backend '{encoder}', expected 'torch', 'onnx' or 'onnx-int8'")
+        self.df, self.embeddings, self.model = load_data(with_model=encoder == "torch")
+        if encoder != "torch":
+            self.model = OnnxEncoder(quantized=encoder == "onnx-int8", threads=encoder_threads)
+        self.candidates = candidates
+        self.ingredient_weight = ingredient_weight
+        self.nutrient_weight = nutrient_weight
+        self.exact_max_rows = exact_max_rows
+        self.filters = load_recipe_filters(self.df)
+        self.all_rows = np.arange(len(self.df))
+
+        # Embedding norms, so an exact scan is one matrix-vector product over the mapped matrix
+        self.embedding_norms = np.maximum(np.linalg.norm(self.embeddings, axis=1), 1e-12).astype(np.float32)
+
+        # Nutrients scaled by corpus-wide column maxima, as unit rows ready for cosine similarity
+        nutrient_values = self.df[NUTRIENT_COLUMNS].fillna(0).to_numpy(dtype=np.float32)
+        self.nutrient_scales = np.where(nutrient_values.max(axis=0) > 0, nutrient_values.max(axis=0), 1)
+        scaled = nutrient_values / self.nutrient_scales
+        self.nutrient_units = scaled / np.maximum(np.linalg.norm(scaled, axis=1, keepdims=True), 1e-12)
+        # Only the returned columns, consolidated so materializing the final rows is cheap, with
+        # missing values as None (NaN isn't valid JSON)
+        records = self.df[RECIPE_COLUMNS]
+        self.records = records.astype(object).where(records.notna(), None)
+        self.ann_indexes = load_ann_indexes(ef_search=max(ef_search, candidates))
+        self.food_embeddings = load_food_embeddings() if compose_queries else None
+        if compose_queries and self.food_embeddings is None:
+            print("⚠️ No food embeddings in the recipe store, queries are embedded by the model. "
+                  "Re-run recipes_train_model.py.")
+        self._query_embedding = lru_cache(maxsize=query_cache_size)(self._embed_query)
+
+    def _embed_query(self, ingredients):
+        """Embedding of a sorted tuple of distinct ingredients, read-only as it is shared through the cache."""
+        embedding = None
+        if self.food_embeddings is not None:
+            food_rows, food_embeddings = self.food_embeddings
+            rows = [food_rows.get(ingredient) for ingredient in ingredients]
+            if ingredients and None not in rows:
+                vectors = food_embeddings[rows]
+                embedding = (vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)).mean(axis=0)
+        if embedding is None:
+            embedding = self.model.encode(" ".join(ingredients), convert_to_numpy=True)
+        embedding.flags.writeable = False
+        return embedding
+
+    def query_cache_info(self):
+        """Hits, misses and size of the query embedding cache."""
+        return self._query_embedding.cache_info()
+
+    def _ingredient_candidates(self, rows, diet, filtered, input_embedding, candidates):
+        """
+        Recipes most similar to the input ingredients, in no particular order.
+        Args:
+            rows (ndarray): Rows allowed by the diet and the filters
+            diet (str): Diet preference, selects the ANN index
+            filtered (bool): Whether filters beyond the diet restrict `rows`
+            candidates (int): Recipes to return, at most
+        Returns:
+            tuple: (store rows, cosine similarities)
+        """
+        index = self.ann_indexes.get(diet if diet in DIET_CATEGORIES else "all")
+        if index is not None and len(rows) > max(self.exact_max_rows, candidates):
+            allowed = None
+            if filtered:
+                allowed = np.zeros(len(self.df), dtype=bool)
+                allowed[rows] = True
+            try:
+                labels, _ = index.knn_query(input_embedding, k=candidates, num_threads=1,
+                                            filter=None if allowed is None else allowed.__getitem__)
+                candidate_rows = labels[0].astype(np.int64)
+                return candidate_rows, cosine_similarities(self.embeddings[candidate_rows], input_embedding)
+            except RuntimeError:
+                pass  # too few allowed recipes reachable in the graph, scan them exactly
+
+        query = input_embedding / max(np.linalg.norm(input_embedding), 1e-12)
+        if 2 * len(rows) > len(self.df):
+            # Most of the corpus: one contiguous product beats gathering the rows first
+            similarities = ((self.embeddings @ query) / self.embedding_norms)[rows]
+        else:
+            similarities = (self.embeddings[rows] @ query) / self.embedding_norms[rows]
+        if len(rows) > candidates:
+            top = np.argpartition(similarities, len(rows) - candidates)[-candidates:]
+            return rows[top], similarities[top]
+        return rows, similarities
+
+    def recommend(self, nutrients, ingredients, diet=None, k=5, recipe_categories=None, max_cook_minutes=None,
+                  max_total_minutes=None, min_rating=None):
+        """
+        Recommend recipes for target nutrients, available ingredients and a diet preference.
+        Args:
+            nutrients (dict): Target value of each column in NUTRIENT_COLUMNS
+            ingredients (list): Ingredient (food) names
+            diet (str, optional): Diet preference, "Veg" only gets vegetarian recipes
+            k (int): Number of recipes
+            recipe_categories (list, optional): Only recipes of these RecipeCategory values
+            max_cook_minutes (float, optional): Only recipes cooking at most this long
+            max_total_minutes (float, optional): Only recipes taking at most this long in total
+            min_rating (float, optional): Only recipes rated at least this (unrated recipes are excluded)
+        Returns:
+            list: Records with the RECIPE_COLUMNS of the best recipes, best first
+        """
+        filters = {"recipe_categories": recipe_categories, "max_cook_minutes": max_cook_minutes,
+                   "max_total_minutes": max_total_minutes, "min_rating": min_rating}
+        filtered = any(value is not None for value in filters.values())
+        rows = self.filters.rows(diet_categories=DIET_CATEGORIES.get(diet), **filters)
+        if rows is None:
+            rows = self.all_rows
+        if len(rows) == 0:
+            return []
+
+        # Encode input ingredients (in a canonical order, so any order hits the cache) and keep the
+        # most similar recipes
+        input_embedding = self._query_embedding(tuple(sorted(set(ingredients))))
+        candidate_rows, ingredient_similarities = self._ingredient_candidates(
+            rows, diet, filtered, input_embedding, max(self.candidates, k))
+
+        # Nutrient cosine similarity on the same corpus-wide scale, fused with the ingredient similarity
+        target = np.array([nutrients[col] for col in NUTRIENT_COLUMNS], dtype=np.float32) / self.nutrient_scales
+        target /= max(np.linalg.norm(target), 1e-12)
+        scores = (self.ingredient_weight * ingredient_similarities
+                  + self.nutrient_weight * (self.nutrient_units[candidate_rows] @ target))
+
+        # Best k, ties broken by row; only they are looked up in the DataFrame
+        if len(scores) > k:
+            top = np.argpartition(scores, len(scores) - k)[-k:]
+            candidate_rows, scores = candidate_rows[top], scores[top]
+        order = np.lexsort((candidate_rows, -scores))
+        records = self.records.iloc[candidate_rows[order]].to_dict(orient="records")
+        # List cells read from Parquet are arrays, returned as plain (JSON serializable) lists
+        for record in records:
+            for column in RECIPE_LIST_COLUMNS:
+                record[column] = list(record[column])
+        return records
+
+
+def recipe_recommender_settings(environ=os.environ):
+    """
+    RecipeRecommender options of the process-wide engine, from environment variables:
+    RECIPES_ENCODER ("torch", "onnx" or "onnx-int8"), RECIPES_ENCODER_THREADS (threads of an
+    ONNX encoder) and RECIPES_COMPOSE_QUERIES ("1" to embed catalog food queries without the model).
+    Returns:
+        dict: Keyword arguments of RecipeRecommender
+    """
+    threads = environ.get("RECIPES_ENCODER_THREADS")
+    return {"encoder": environ.get("RECIPES_ENCODER", "torch"),
+            "encoder_threads": int(threads) if threads else None,
+            "compose_queries": environ.get("RECIPES_COMPOSE_QUERIES", "0").lower() in ("1", "true", "yes")}
+
+
+_recommender = None
+_recommender_lock = threading.Lock()
+
+def get_recipe_recommender():
+    """Return the process-wide RecipeRecommender, loading it on first use (see `recipe_recommender_settings`)."""
+    global _recommender
+    if _recommender is None:
+        with _recommender_lock:
+            if _recommender is None:
+                _recommender = RecipeRecommender(**recipe_recommender_settings())
+    return _recommender
+
 
 def recommend_recipes(nutrients, ingredients, diet_preference):
-#def recommend_recipes(ingredients, diet_preference):
     """Recommend recipes based on user nutrients, ingredients, and dietary preference."""
-    df, model_st = load_data()
-
-    # Filter by dietary preference
-    if diet_preference == "Veg":
-        df_filtered = df[df["DietaryCategory"] == diet_preference].copy()
-    else:
-        df_filtered = df.copy()
-
-    # Encode input ingredients and move them to the same device
-    input_embedding = model_st.encode(" ".join(ingredients), convert_to_tensor=True).to(device)
-
-    # Stack ingredient embeddings and move to the same device
-    ingredient_embeddings = torch.stack(df_filtered["IngredientEmbedding"].tolist()).to(device)
-
-    """# Compute cosine similarity
-    ingredient_similarities = util.pytorch_cos_sim(ingredient_embeddings, input_embedding).squeeze().cpu().numpy()
-
-    # Compute Euclidean similarity for nutrients
-    # nutrient_columns = ["Calories", "FatContent", "SaturatedFatContent", "CholesterolContent", 
-    #                     "SodiumContent", "CarbohydrateContent", "FiberContent", "SugarContent", "ProteinContent"]
-
-    nutrient_columns = ["Calories", "FatContent", "CarbohydrateContent", "FiberContent", "SugarContent", "ProteinContent"]
-    
-    df_nutrients = df_filtered[nutrient_columns].fillna(0).to_numpy()
-    input_nutrient_array = np.array([nutrients[col] for col in nutrient_columns]).reshape(1, -1)
-    if input_nutrient_array.max() > 0:
-        input_nutrient_array = input_nutrient_array/input_nutrient_array.max() # to normalize
-
-    #nutrient_distances = np.linalg.norm(df_nutrients - input_nutrient_array, axis=1)
-    #nutrient_similarities = 1 / (1 + nutrient_distances)
-
-    #trying cosine similarity
-    # Extract recipe nutrient vectors
-    recipe_vectors = np.array(df_filtered[nutrient_columns].values)  # Get nutrient values only
-    recipe_vectors = recipe_vectors/recipe_vectors.max() # to normalize
-
-    # Compute cosine similarity between user input and all recipes
-    nutrient_similarities = cosine_similarity(input_nutrient_array, recipe_vectors)
-
-    # Add similarity scores to DataFrame
-    df_filtered["similarity"] = nutrient_similarities[0]
-
-    # Sort recipes by similarity score
-    #recommended_recipes = recipes.sort_values(by="similarity", ascending=False)
-
-    # Display Top Recommendations
-    #print(recommended_recipes[["recipe", "similarity"]])
-
-    # Final score (weighted)
-    final_scores = (0.4 * nutrient_similarities) + (0.6 * ingredient_similarities)
-
-    # Get top recommendations
-    df_filtered["SimilarityScore"] = final_scores.flatten()
-    top_recipes = df_filtered.sort_values(by="SimilarityScore", ascending=False).head(5)
-
-    return top_recipes[
-        [
-            "Name", "CookTime", "Images", "RecipeCategory", "Keywords", 
-            "RecipeIngredientQuantities", "RecipeIngredientParts", 
-            "Calories", "FatContent", "SaturatedFatContent", "CholesterolContent", 
-            "SodiumContent", "CarbohydrateContent", "FiberContent", 
-            "SugarContent", "ProteinContent", "RecipeInstructions", "DietaryCategory"
-        ]
-    ].to_dict(orient="records")"""
-# trying to get recommendation in two steps
-# Compute cosine similarity
-    ingredient_similarities = util.pytorch_cos_sim(ingredient_embeddings, input_embedding).squeeze().cpu().numpy()
-
- # Add similarity scores to DataFrame
-   # 
-    df_filtered["ingredient_similarity"] = ingredient_similarities
-    # Sort recipes by similarity score
-    recommended_recipes = df_filtered.sort_values(by="ingredient_similarity", ascending=False)
-
-    recommended_recipes=recommended_recipes.head(50)
-     # Compute Euclidean similarity for nutrients
-    nutrient_columns = ["Calories", "FatContent", "CarbohydrateContent", "FiberContent", 
-                        "SugarContent", "ProteinContent"]
-    
-    df_nutrients = recommended_recipes[nutrient_columns].fillna(0).to_numpy()
-    input_nutrient_array = np.array([nutrients[col] for col in nutrient_columns]).reshape(1, -1)
-    if input_nutrient_array.max() > 0:
-        input_nutrient_array = input_nutrient_array/input_nutrient_array.max() # to normalize
-
-    # Extract recipe nutrient vectors
-    recipe_vectors = np.array(recommended_recipes[nutrient_columns].values)  # Get nutrient values only
-    recipe_vectors = recipe_vectors/recipe_vectors.max() # to normalize
-
-    # Compute cosine similarity between user input and all recipes
-    nutrient_similarities = cosine_similarity(input_nutrient_array, recipe_vectors)
-
-    # Add similarity scores to DataFrame
-    recommended_recipes["nutrient_similarity"] = nutrient_similarities[0]
-     # Final score (weighted)
-    #final_scores = (0.5 * nutrient_similarities) + (0.5 * ingredient_similarities)
-
-      # Get top recommendations
-    recommended_recipes["SimilarityScore"] = recommended_recipes.apply(lambda row:row["nutrient_similarity"]*0.5 + row["ingredient_similarity"]*0.5, axis=1)
-
-    # Sort recipes by similarity score
-    recommended_recipes = recommended_recipes.sort_values(by="SimilarityScore", ascending=False)
-    top_recipes = recommended_recipes.head(5)
-    return top_recipes[
-        [
-            "Name", "CookTime", "Images", "RecipeCategory", "Keywords", 
-            "RecipeIngredientQuantities", "RecipeIngredientParts", 
-            "Calories", "FatContent", "SaturatedFatContent", "CholesterolContent", 
-            "SodiumContent", "CarbohydrateContent", "FiberContent", 
-            "SugarContent", "ProteinContent", "RecipeInstructions", "DietaryCategory"
-        ]
-    ].to_dict(orient="records")
-    # Display Top Recommendations
-    #print(recommended_recipes[["recipe", "similarity"]])    
-    #return recommended_recipes
-#print (recommend_recipes('iron','veg'))
\ No newline at end of file
+    return get_recipe_recommender().recommend(nutrients, ingredients, diet_preference)
@@ -1,9 +1,8 @@
 import numpy as np
-import pandas as pd
 import torch
 from sentence_transformers import SentenceTransformer, util
 from sklearn.metrics.pairwise import cosine_similarity
-import pickle
+from recipes_recommend import load_data as load_recipe_data
 
 # Set device (CPU or GPU)
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -18,13 +17,10 @@ class MyCustomClass:
 # Load model
 def load_data():
     """ Load dataset with embeddings """
-    df = pd.read_csv("data/embeddings/recipes.csv")
-    
-    # Ensure embeddings are properly converted to tensors and moved to the correct device
-    df["IngredientEmbedding"] = df["IngredientEmbedding"].apply(lambda x: torch.tensor(eval(x)).to(device))
+    df, embeddings, model_st = load_recipe_data()
 
-    with open("models/recipes_st.pkl", "rb") as model_file:
-        model_st = pickle.load(model_file)
+    # One tensor per recipe on the correct device, the layout the plots below expect
+    df["IngredientEmbedding"] = list(torch.from_numpy(np.array(embeddings)).to(device))
 
     return df, model_st
 
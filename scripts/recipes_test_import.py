@@ -0,0 +1,61 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Import-time budget of recipes_recommend, which the API and the Streamlit page import on
+# startup. Each run imports it in a fresh interpreter with `python -X importtime` and the
+# check fails (exit code 1) when a model dependency is imported eagerly or the import
+# takes longer than the budget, so import cost regressions show up before they ship.
+MODULE = "recipes_recommend"
+# Only needed once the model or the ANN index is loaded, never on import
+LAZY_MODULES = ["torch", "sentence_transformers", "transformers", "sklearn", "hnswlib", "onnxruntime"]
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+parser = argparse.ArgumentParser(description=f"Check the import time of {MODULE}.")
+parser.add_argument("--budget-ms", type=float, default=1500, help="Longest acceptable import time")
+parser.add_argument("--runs", type=int, default=3, help="Imports measured, the fastest one counts")
+args = parser.parse_args()
+
+
+def import_times(module):
+    """
+    Cumulative import time of every module imported by importing `module` in a fresh interpreter.
+    Returns:
+        dict: Module name -> (cumulative microseconds, nesting depth)
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=SCRIPTS_DIR, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times[name.strip()] = (int(cumulative), depth)
+    return times
+
+
+runs = [import_times(MODULE) for _ in range(args.runs)]
+times = min(runs, key=lambda run: run[MODULE][0])
+import_ms = times[MODULE][0] / 1000
+
+print(f"import {MODULE}: {import_ms:.0f} ms (budget {args.budget_ms:.0f} ms, fastest of {args.runs})")
+# The heaviest modules the module imports itself
+direct = sorted(((us, name) for name, (us, depth) in times.items() if depth == times[MODULE][1] + 1), reverse=True)
+for us, name in direct[:5]:
+    print(f"   {name:<24} {us / 1000:>8.1f} ms")
+
+failures = []
+eager = sorted({name.split(".")[0] for name in times} & set(LAZY_MODULES))
+if eager:
+    failures.append(f"{', '.join(eager)} imported eagerly")
+if import_ms > args.budget_ms:
+    failures.append(f"import took {import_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+
+if failures:
+    print(f"⚠️ {MODULE} import check failed: {'; '.join(failures)}.")
+    sys.exit(1)
+print(f"✅ {MODULE} imports within budget and without model dependencies.")
@@ -1,66 +1,143 @@
+import argparse
 import pandas as pd
 import torch
 from sentence_transformers import SentenceTransformer
-import pickle
 import numpy as np
 import os
-
-# Load dataset
-df = pd.read_csv("data/preprocessed/recipes.csv")
-#df =df.iloc[0:50000]
+import time
+from recipes_recommend import (stream_recipe_embeddings, build_ann_index, save_recipe_ann, save_food_embeddings,
+                               read_recipes, format_r_list, RECIPE_EMBEDDINGS_PATH, RECIPES_MODEL_DIR,
+                               DIET_CATEGORIES)
+from recipes_embedding_cache import EmbeddingCache
 
 # Initialize model
 #st_model = SentenceTransformer("all-MiniLM-L6-v2")
 
 #all-mpnet-base-v2
-# st_model = SentenceTransformer("all-mpnet-base-v2") - Observation Recommendation gets better but slow compared to all-MiniLM-L6-v2 
+# st_model = SentenceTransformer("all-mpnet-base-v2") - Observation Recommendation gets better but slow compared to all-MiniLM-L6-v2
 
 #all-mpnet-base-v2
-st_model = SentenceTransformer("paraphrase-MiniLM-L6-v2")
-
-# Save the trained model
-with open("models/recipes_st.pkl", "wb") as model_file:
-    pickle.dump(st_model, model_file)
-
-
-# # Compute embeddings
-# df["IngredientEmbedding"] = df["RecipeIngredientParts"].apply(lambda x: st_model.encode(str(x), convert_to_tensor=True).tolist())
-
-# # Save embeddings
-# df.to_csv("data/embeddings/recipes.csv", index=False)
-
-# Code for batch processing
-
-# Define batch parameters
-batch_size = 5000
-num_batches = (len(df) + batch_size - 1) // batch_size  # Calculate the number of batches
-
-# Directory to save batch embeddings
-embedding_dir = "data/embeddings/batches"
-os.makedirs(embedding_dir, exist_ok=True)
-
-# Process each batch
-for i in range(num_batches):
-    start_idx = i * batch_size
-    end_idx = min((i + 1) * batch_size, len(df))
-    batch_df = df.iloc[start_idx:end_idx].copy()  # Use .copy() to avoid SettingWithCopyWarning
-
-    # Print the row indices for the current batch
-    print(f"Processing batch {i+1}/{num_batches}, rows {start_idx} to {end_idx-1}")
-
-    # Compute embeddings and add as a new column
-    batch_df["IngredientEmbedding"] = batch_df["RecipeIngredientParts"].apply(
-        lambda x: st_model.encode(str(x), convert_to_tensor=True).tolist()
-    )
-
-    # Save the updated DataFrame to CSV
-    batch_df.to_csv(f"{embedding_dir}/embeddings_batch_{i+1}.csv", index=False)
-    print(f"Saved embeddings for batch {i+1}/{num_batches}")
-
-# Optionally, concatenate all batch files into a single embeddings file
-all_embeddings = pd.concat(
-    [pd.read_csv(f"{embedding_dir}/embeddings_batch_{i+1}.csv") for i in range(num_batches)],
-    ignore_index=True
-)
-all_embeddings.to_csv("data/embeddings/recipes.csv", index=False)
-print("All batch embeddings concatenated and saved.")
+model_name = "paraphrase-MiniLM-L6-v2"
+
+# Food catalog whose descriptions users pick as recipe ingredients
+FOOD_CATALOG_PATH = "data/original/food.csv"
+
+
+def encode_chunks(st_model, texts, pool, chunk_size, batch_size):
+    """
+    Encode texts `chunk_size` at a time, yielding one float32 block per chunk.
+
+    SentenceTransformer batches `batch_size` texts per forward pass; with a pool, each chunk
+    is also sharded across its worker processes.
+    """
+    for start_idx in range(0, len(texts), chunk_size):
+        chunk = texts[start_idx:start_idx + chunk_size]
+        start = time.perf_counter()
+        if pool is not None:
+            embeddings = st_model.encode_multi_process(chunk, pool, batch_size=batch_size)
+        else:
+            embeddings = st_model.encode(chunk, batch_size=batch_size, convert_to_numpy=True)
+        print(f"Encoded rows {start_idx} to {start_idx + len(chunk) - 1} "
+              f"({len(chunk) / (time.perf_counter() - start):.0f} recipes/s)")
+        yield embeddings.astype(np.float32)
+
+
+def start_encoder_pool(st_model, workers):
+    """
+    Start `workers` CPU encoder processes sharing the cores (None for a single worker, which
+    encodes in this process with all of them). Workers read their thread count on start, so
+    each gets cores // workers threads instead of all of them.
+    """
+    if workers <= 1:
+        return None
+    threads = str(max(1, (os.cpu_count() or 1) // workers))
+    os.environ.update(OMP_NUM_THREADS=threads, MKL_NUM_THREADS=threads)
+    return st_model.start_multi_process_pool(["cpu"] * workers)
+
+
+# The process pool re-imports this module in every worker, so the work must not run on import
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed the recipes and build the recipe search indexes.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Encoder processes sharing the CPU cores; 1 encodes in this process with all of "
+                             "them (compare with recipes_encode_benchmark.py)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Recipes per forward pass")
+    parser.add_argument("--chunk-size", type=int, default=50_000,
+                        help="Recipes encoded per cache commit")
+    parser.add_argument("--prune-cache", action="store_true",
+                        help="Drop cached embeddings no current recipe or catalog food uses, and compact the cache")
+    args = parser.parse_args()
+
+    # Load dataset
+    df = read_recipes()
+    #df =df.iloc[0:50000]
+
+    st_model = SentenceTransformer(model_name)
+
+    # Save the trained model (safetensors weights, memory-mapped by recipes_recommend.load_model)
+    st_model.save(RECIPES_MODEL_DIR, safe_serialization=True)
+
+    # Only ingredient lists the cache has never seen are embedded, each distinct list once
+    cache = EmbeddingCache(model_name)
+    # Ingredients are embedded as their R list text, as they always were, so cached embeddings stay valid
+    texts = df["RecipeIngredientParts"].map(lambda parts: EmbeddingCache.normalize(format_r_list(parts))).to_numpy()
+    keys = EmbeddingCache.keys(texts)
+    unique_keys, first_rows = np.unique(keys, return_index=True)
+    missing_rows = np.sort(first_rows[~cache.contains(unique_keys)])
+    print(f"{len(df)} recipes, {len(unique_keys)} distinct ingredient lists, {len(missing_rows)} not in the cache")
+
+    # Encode in large batches on a pool of CPU processes, committing every chunk to the cache
+    # as soon as it is encoded, so an interrupted run resumes after the last committed chunk
+    pool = start_encoder_pool(st_model, args.workers) if len(missing_rows) else None
+    start = time.perf_counter()
+    try:
+        chunks = encode_chunks(st_model, texts[missing_rows].tolist(), pool, args.chunk_size, args.batch_size)
+        for chunk_start, embeddings in zip(range(0, len(missing_rows), args.chunk_size), chunks):
+            cache.add(keys[missing_rows[chunk_start:chunk_start + args.chunk_size]], embeddings)
+    finally:
+        if pool is not None:
+            st_model.stop_multi_process_pool(pool)
+    elapsed = time.perf_counter() - start
+    if len(missing_rows):
+        print(f"✅ Embedded {len(missing_rows)} ingredient lists in {elapsed:.1f} s "
+              f"({len(missing_rows) / elapsed:.0f} recipes/s, {args.workers} worker(s)).")
+
+    # Stream the embeddings from the cache into the binary store, aligned with the recipes by RecipeId
+    embeddings = stream_recipe_embeddings(
+        (cache.get(keys[i:i + args.chunk_size]) for i in range(0, len(keys), args.chunk_size)),
+        df["RecipeId"].to_numpy(), st_model.get_sentence_embedding_dimension(), model_name)
+    print(f"✅ Embeddings of {len(df)} recipes saved to '{os.path.dirname(RECIPE_EMBEDDINGS_PATH)}'.")
+
+    # Approximate nearest-neighbour (HNSW) indexes, one per diet plus one over all recipes, so
+    # recipe search scales to the full corpus. Higher M / ef_construction give better recall,
+    # at the cost of memory and build time (see recipes_ann_report.py).
+    ann_params = {"M": 16, "ef_construction": 200}
+    try:
+        ann_indexes = {"all": build_ann_index(embeddings, np.arange(len(df)), **ann_params)}
+        for diet, categories in DIET_CATEGORIES.items():
+            ann_indexes[diet] = build_ann_index(embeddings, np.flatnonzero(df["DietaryCategory"].isin(categories)),
+                                                **ann_params)
+        save_recipe_ann(ann_indexes, ann_params)
+        print(f"ANN indexes ({', '.join(ann_indexes)}) saved next to the embeddings.")
+    except ImportError:
+        print("⚠️ hnswlib is not installed, skipping the ANN indexes (recipe search will be exact).")
+
+    # Embeddings of the food catalog descriptions, so the recommender can compose the embedding
+    # of a query made of catalog foods without running the model
+    if os.path.exists(FOOD_CATALOG_PATH):
+        food_names = pd.read_csv(FOOD_CATALOG_PATH, usecols=["description"])["description"].astype(str).unique()
+        food_texts = np.array([EmbeddingCache.normalize(name) for name in food_names], dtype=object)
+        food_keys = EmbeddingCache.keys(food_texts)
+        missing = ~cache.contains(food_keys)
+        if missing.any():
+            cache.add(food_keys[missing], st_model.encode(food_texts[missing].tolist(), batch_size=args.batch_size,
+                                                          convert_to_numpy=True))
+        save_food_embeddings(food_names, cache.get(food_keys))
+        print(f"Embeddings of {len(food_names)} catalog foods saved next to the recipe embeddings.")
+        keys = np.concatenate([keys, food_keys])
+    else:
+        print(f"⚠️ No food catalog at '{FOOD_CATALOG_PATH}', skipping the food embeddings.")
+
+    if args.prune_cache:
+        dropped = cache.compact(keep_keys=keys)
+        print(f"✅ Embedding cache compacted: {dropped} unused embeddings dropped, {len(cache)} kept.")